@@ -0,0 +1,274 @@
+# admission.py
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from telemetry import ADMISSION_WAIT
+
+# Upper bound on how long a waiting request sleeps between checks, so a
+# deadline is noticed even when nothing else wakes it.
+POLL_SECONDS = 0.5
+
+
+class AdmissionRejected(RuntimeError):
+    """The request was shed: the queue is full or the wait would be too long."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second.
+
+    Not thread-safe; ``AdmissionController`` only touches it under its lock.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available; 0 when one is available now."""
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+
+class _SharedStream:
+    """Chunks of one in-flight stream, replayed to every coalesced reader."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+
+    def append(self, chunk: str):
+        with self._condition:
+            self._chunks.append(chunk)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def follow(self, timeout: float) -> Iterator[str]:
+        position = 0
+        while True:
+            with self._condition:
+                if position == len(self._chunks) and not self._done:
+                    if not self._condition.wait(timeout):
+                        raise AdmissionRejected("The shared request stalled")
+                chunks = self._chunks[position:]
+                done, error = self._done, self._error
+            position += len(chunks)
+            yield from chunks
+            if done and position == len(self._chunks):
+                if error is not None:
+                    raise AdmissionRejected("The shared request failed") from error
+                return
+
+
+class AdmissionController:
+    """Process-wide admission for LLM calls.
+
+    Every call waits in one FIFO queue and starts only when it is at the head,
+    fewer than ``max_concurrency`` calls are running and the token bucket
+    (``rate_per_minute`` sustained, ``burst`` at once) has a token. Requests
+    are shed with ``AdmissionRejected`` when ``max_queue`` are already waiting
+    or when they would wait longer than ``max_wait`` seconds, which keeps the
+    tail latency bounded instead of letting the queue grow without limit.
+
+    Identical in-flight requests, identified by a caller-chosen key, are
+    coalesced: only the first one is admitted and calls the model, and the
+    others share its result (or its stream, chunk by chunk).
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float = 30,
+        burst: int = 5,
+        max_concurrency: int = 4,
+        max_queue: int = 50,
+        max_wait: float = 60.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._bucket = TokenBucket(rate_per_minute / 60, burst)
+        self._condition = threading.Condition()
+        self._queue: Deque[object] = deque()
+        self._active = 0
+        self._streams: Dict[Hashable, _SharedStream] = {}
+        self._calls: Dict[Hashable, Future] = {}
+
+    def _poll(self, ticket: object, deadline: float) -> Tuple[Optional[int], float]:
+        """Admit ``ticket`` if it may start; else return its position and a wait.
+
+        Caller holds the lock.
+        """
+        now = time.monotonic()
+        position = self._queue.index(ticket)
+        delay = POLL_SECONDS
+        if position == 0 and self._active < self.max_concurrency:
+            delay = self._bucket.delay(now)
+            if delay == 0:
+                self._queue.popleft()
+                self._bucket.take(now)
+                self._active += 1
+                # The next ticket is now at the head.
+                self._condition.notify_all()
+                return None, 0.0
+        if now >= deadline:
+            raise AdmissionRejected(
+                f"No capacity for {self.max_wait:.0f} seconds; please try again"
+            )
+        return position, min(delay, POLL_SECONDS, deadline - now)
+
+    @contextmanager
+    def admit(self, on_wait: Optional[Callable[[int], None]] = None) -> Iterator[None]:
+        """Hold one admission for the duration of the block.
+
+        ``on_wait`` is called, outside the lock, with the number of requests
+        ahead whenever that number changes while waiting.
+        """
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        ticket = object()
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                ADMISSION_WAIT.record(0.0, {"newsllm.admission": "rejected"})
+                raise AdmissionRejected("Too many requests are waiting; try again")
+            self._queue.append(ticket)
+
+        reported = None
+        try:
+            while True:
+                with self._condition:
+                    position, timeout = self._poll(ticket, deadline)
+                    if position is None:
+                        break
+                    if on_wait is None or position == reported:
+                        self._condition.wait(timeout)
+                        continue
+                reported = position
+                on_wait(position)
+        except BaseException as error:
+            with self._condition:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+            outcome = "rejected" if isinstance(error, AdmissionRejected) else "aborted"
+            ADMISSION_WAIT.record(
+                time.monotonic() - start, {"newsllm.admission": outcome}
+            )
+            raise
+        ADMISSION_WAIT.record(
+            time.monotonic() - start, {"newsllm.admission": "admitted"}
+        )
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def call(
+        self,
+        key: Optional[Hashable],
+        function: Callable[..., Any],
+        *args,
+        on_wait: Optional[Callable[[int], None]] = None,
+        **kwargs,
+    ) -> Any:
+        """Run ``function`` under admission, sharing the result of an identical call.
+
+        A ``key`` of None never coalesces.
+        """
+        with self._condition:
+            future = self._calls.get(key) if key is not None else None
+            leader = future is None
+            if leader:
+                future = Future()
+                if key is not None:
+                    self._calls[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            with self.admit(on_wait):
+                result = function(*args, **kwargs)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._condition:
+                if key is not None and self._calls.get(key) is future:
+                    del self._calls[key]
+
+    def stream(
+        self,
+        key: Optional[Hashable],
+        factory: Callable[[], Iterator[str]],
+        on_wait: Optional[Callable[[int], None]] = None,
+    ) -> Iterator[str]:
+        """Yield the chunks of ``factory()`` under admission.
+
+        A request whose ``key`` matches a stream already in flight replays
+        that stream from its start instead of calling the model again. Nothing
+        is queued until the first chunk is requested.
+        """
+        with self._condition:
+            shared = self._streams.get(key) if key is not None else None
+            if shared is None:
+                shared = _SharedStream()
+                if key is not None:
+                    self._streams[key] = shared
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            yield from shared.follow(self.max_wait)
+            return
+
+        error = None
+        try:
+            with self.admit(on_wait):
+                for chunk in factory():
+                    shared.append(chunk)
+                    yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            shared.finish(error)
+            with self._condition:
+                if key is not None and self._streams.get(key) is shared:
+                    del self._streams[key]
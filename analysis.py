@@ -0,0 +1,358 @@
+# analysis.py
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_google_genai import ChatGoogleGenerativeAI
+from prompts import (
+    CHAT_RESPONSE_PROMPT,
+    CONVERSATION_SUMMARY_PROMPT,
+    FOLLOW_UP_QUESTIONS_PROMPT,
+    MAIN_SYSTEM_PROMPT,
+)
+from telemetry import LLM_DURATION, record_llm_usage, timed_span, tracer
+
+logger = logging.getLogger(__name__)
+
+# Prompt budget for retrieved article text, in (estimated) tokens.
+CONTEXT_TOKEN_BUDGET = 3000
+# Chunks retrieved before selection. More candidates than fit the budget lets
+# the selection spread the context over more distinct articles.
+CANDIDATE_CHUNKS = 24
+# Smaller budget for the passages backing a chat reply.
+CHAT_CONTEXT_TOKEN_BUDGET = 1500
+
+
+def create_llm() -> BaseChatModel:
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise ValueError("Please set the google_api_key environment variable")
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash", google_api_key=google_api_key, temperature=0.2
+    )
+
+
+class AnalysisCache:
+    """Cross-session cache of generated analyses.
+
+    Entries are keyed by country, topic and database generation (the timestamp
+    written by ``NewsDatabase._save_last_update``), so an analysis is reused
+    until the next refresh and never served against newer data.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS analyses (
+                    country TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    generation TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (country, topic, generation)
+                )
+                """
+            )
+
+    def get(self, country: str, topic: str, generation: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT analysis FROM analyses "
+                "WHERE country = ? AND topic = ? AND generation = ?",
+                (country, topic, generation),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, country: str, topic: str, generation: str, analysis: Dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?)",
+                (country, topic, generation, json.dumps(analysis), time.time()),
+            )
+            # Analyses of older generations can never be served again.
+            # Generations are ISO timestamps, so they sort chronologically.
+            self._conn.execute(
+                "DELETE FROM analyses WHERE generation < ?", (generation,)
+            )
+
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English text; no tokenizer needed.
+    return len(text) // 4 + 1
+
+
+def _article_key(document: Document) -> str:
+    # Documents indexed before chunking have no parent reference.
+    return document.metadata.get("parent_id") or document.metadata["source"]
+
+
+def _chunk_tokens(chunk: Document) -> int:
+    # Chunks not hydrated yet carry the length of their text instead.
+    if chunk.page_content or "length" not in chunk.metadata:
+        return estimate_tokens(chunk.page_content)
+    return chunk.metadata["length"] // 4 + 1
+
+
+def select_chunks(
+    chunks: List[Document], token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> List[Document]:
+    """Pick chunks in relevance order under a token budget, spread over articles.
+
+    Selection goes round by round: the best remaining chunk of each article,
+    in order of the article's best match, before any article gets another one.
+    Chunks need not be hydrated; their ``length`` is enough.
+    """
+    by_article: Dict[str, List[Document]] = {}
+    for chunk in chunks:
+        by_article.setdefault(_article_key(chunk), []).append(chunk)
+
+    selected = []
+    remaining = token_budget
+    for round_index in range(max(map(len, by_article.values()), default=0)):
+        for article_chunks in by_article.values():
+            if round_index >= len(article_chunks):
+                continue
+            chunk = article_chunks[round_index]
+            cost = _chunk_tokens(chunk)
+            if cost > remaining:
+                if round_index or remaining < token_budget // 10:
+                    continue
+                # An oversized first chunk (e.g. a page indexed whole) is cut
+                # to fit rather than leaving its article out.
+                chunk = Document(
+                    id=chunk.id,
+                    page_content=chunk.page_content[: remaining * 4],
+                    metadata={**chunk.metadata, "length": remaining * 4},
+                )
+                cost = remaining
+            selected.append(chunk)
+            remaining -= cost
+    return selected
+
+
+def source_urls(documents: List[Document]) -> List[str]:
+    return list(dict.fromkeys(doc.metadata["source"] for doc in documents))
+
+
+def build_context(documents: List[Document]) -> str:
+    """Join chunks into one numbered entry per article, in reading order."""
+    by_article: Dict[str, List[Document]] = {}
+    for doc in documents:
+        by_article.setdefault(_article_key(doc), []).append(doc)
+    return "\n\n".join(
+        [
+            f"Article {i+1}:\n"
+            + " ... ".join(
+                doc.page_content
+                for doc in sorted(chunks, key=lambda d: d.metadata.get("chunk", 0))
+            )
+            + "..."
+            for i, chunks in enumerate(by_article.values())
+        ]
+    )
+
+
+def retrieve_documents(
+    db, country: str, topic: str, token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> List[Document]:
+    query = f"{country} {topic} news"
+    candidates = db.search(
+        query, country, topic, k=CANDIDATE_CHUNKS, diverse=True, hydrate=False
+    )
+    # Only the chunks that make it into the prompt are read from disk.
+    return db.hydrate(select_chunks(candidates, token_budget))
+
+
+def retrieve_passages(
+    db,
+    question: str,
+    country: str,
+    topic: str,
+    token_budget: int = CHAT_CONTEXT_TOKEN_BUDGET,
+) -> List[Document]:
+    """Find passages supporting an answer to a chat question.
+
+    Uses hybrid (BM25 + vector) search, so names and numbers in the question
+    match even when the embedding does not capture them.
+    """
+    candidates = db.hybrid_search(
+        question, country, topic, k=CANDIDATE_CHUNKS // 2, hydrate=False
+    )
+    return db.hydrate(select_chunks(candidates, token_budget))
+
+
+def _traced_llm(chain: str):
+    return timed_span(
+        "llm.chain",
+        LLM_DURATION,
+        **{"newsllm.chain": chain, "gen_ai.operation.name": "chat"},
+    )
+
+
+def _stream_chain(name: str, chain, inputs: Dict) -> Iterator[str]:
+    with _traced_llm(name):
+        message = None
+        for chunk in chain.stream(inputs):
+            message = chunk if message is None else message + chunk
+            yield chunk.content
+        record_llm_usage(name, message)
+
+
+def stream_summary(
+    llm: BaseChatModel, country: str, topic: str, documents: List[Document]
+) -> Iterator[str]:
+    """Yield the analysis text token by token as the model produces it."""
+    return _stream_chain(
+        "summary",
+        MAIN_SYSTEM_PROMPT | llm,
+        {
+            "country": country,
+            "topic": topic,
+            "context": build_context(documents),
+        },
+    )
+
+
+def stream_chat_response(
+    llm: BaseChatModel,
+    country: str,
+    topic: str,
+    user_input: str,
+    chat_history: str,
+    passages: List[Document],
+) -> Iterator[str]:
+    """Yield a follow-up chat answer grounded in ``passages``."""
+    return _stream_chain(
+        "chat",
+        CHAT_RESPONSE_PROMPT | llm,
+        {
+            "country": country,
+            "topic": topic,
+            "user_input": user_input,
+            "chat_history": chat_history,
+            "context": build_context(passages),
+        },
+    )
+
+
+def generate_follow_up(llm: BaseChatModel, summary: str) -> str:
+    questions_chain = FOLLOW_UP_QUESTIONS_PROMPT | llm
+    with _traced_llm("follow_up"):
+        message = questions_chain.invoke({"summary": summary})
+        record_llm_usage("follow_up", message)
+    return message.content
+
+
+def summarize_conversation(
+    llm: BaseChatModel,
+    country: str,
+    topic: str,
+    summary: str,
+    turns: str,
+    max_words: int,
+) -> str:
+    """Fold ``turns`` into the running ``summary`` of a chat."""
+    summary_chain = CONVERSATION_SUMMARY_PROMPT | llm
+    with _traced_llm("memory"):
+        message = summary_chain.invoke(
+            {
+                "country": country,
+                "topic": topic,
+                "summary": summary or "(none yet)",
+                "turns": turns,
+                "max_words": max_words,
+            }
+        )
+        record_llm_usage("memory", message)
+    return message.content.strip()
+
+
+def generate_analysis(
+    db, llm: BaseChatModel, country: str, topic: str
+) -> Optional[Dict]:
+    """Run retrieval and both prompt chains for one country/topic.
+
+    Returns None when no documents match. A returned analysis with an empty
+    ``summary`` means the model produced nothing and should not be cached.
+    """
+    with tracer.start_as_current_span(
+        "news.analysis", attributes={"newsllm.country": country, "newsllm.topic": topic}
+    ):
+        return _generate_analysis(db, llm, country, topic)
+
+
+def _generate_analysis(
+    db, llm: BaseChatModel, country: str, topic: str
+) -> Optional[Dict]:
+    relevant_documents = retrieve_documents(db, country, topic)
+    if not relevant_documents:
+        return None
+
+    summary = "".join(stream_summary(llm, country, topic, relevant_documents))
+    analysis = {
+        "summary": "",
+        "follow_up": "",
+        "sources": source_urls(relevant_documents),
+    }
+    if summary.strip():
+        analysis["summary"] = summary
+        analysis["follow_up"] = generate_follow_up(llm, summary)
+    return analysis
+
+
+def finish_analysis(
+    llm: BaseChatModel,
+    cache: AnalysisCache,
+    country: str,
+    topic: str,
+    generation: str,
+    summary: str,
+    sources: List[str],
+) -> str:
+    """Generate follow-up questions for a streamed summary and cache the result.
+
+    Safe to run in a background thread: it touches no UI state.
+    """
+    follow_up = generate_follow_up(llm, summary)
+    cache.put(
+        country,
+        topic,
+        generation,
+        {"summary": summary, "follow_up": follow_up, "sources": sources},
+    )
+    return follow_up
+
+
+def get_or_generate_analysis(
+    db, llm: BaseChatModel, cache: AnalysisCache, country: str, topic: str
+) -> Optional[Dict]:
+    generation = db.generation()
+    analysis = cache.get(country, topic, generation)
+    if analysis is None:
+        analysis = generate_analysis(db, llm, country, topic)
+        if analysis and analysis["summary"]:
+            cache.put(country, topic, generation, analysis)
+    return analysis
+
+
+def prewarm_analyses(db, llm: BaseChatModel, cache: AnalysisCache):
+    """Generate and cache every country/topic analysis for the current generation."""
+    logger.info("Pre-warming analysis cache...")
+    for country in db.countries:
+        for topic in db.topics:
+            try:
+                get_or_generate_analysis(db, llm, cache, country, topic)
+            except Exception:
+                logger.exception(f"Failed to pre-warm analysis for {country} | {topic}")
+    logger.info("Analysis cache pre-warmed")
@@ -7,27 +7,81 @@ sys.modules["sqlite3"] = sys.modules.pop("pysqlite3")
 
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import pytz
 import streamlit as st
+from admission import AdmissionController, AdmissionRejected
+from analysis import (
+    create_llm,
+    finish_analysis,
+    retrieve_documents,
+    retrieve_passages,
+    source_urls,
+    stream_chat_response,
+    stream_summary,
+    summarize_conversation,
+)
 from database import NewsDatabase
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from prompts import CHAT_RESPONSE_PROMPT, FOLLOW_UP_QUESTIONS_PROMPT, MAIN_SYSTEM_PROMPT
+from memory import SUMMARY_MAX_WORDS, ConversationMemory
+from telemetry import setup_telemetry
 
 load_dotenv()
+setup_telemetry()
+
+# Process-wide limits on LLM calls, shared by every session. Requests past the
+# queue length or the wait are turned away rather than piling up on Gemini.
+LLM_REQUESTS_PER_MINUTE = 30
+LLM_BURST = 5
+LLM_MAX_CONCURRENCY = 4
+LLM_MAX_QUEUE = 50
+LLM_MAX_WAIT_SECONDS = 60
+BUSY_MESSAGE = "The assistant is busy right now. Please try again in a minute."
+
+
+# Streamlit re-executes this script on every interaction; cache_resource keeps
+# one LLM client and one database (with its embedding model and Chroma client)
+# per process.
+@st.cache_resource(show_spinner=False)
+def get_llm():
+    return create_llm()
+
+
+@st.cache_resource(show_spinner=False)
+def get_database():
+    # Ingestion normally runs in a separate worker (python database.py
+    # --worker) and app replicas only read. Single-process deployments can
+    # set NEWSLLM_INGEST_IN_APP=1 to run the scheduler here instead.
+    if os.getenv("NEWSLLM_INGEST_IN_APP") == "1":
+        database = NewsDatabase(analysis_llm=get_llm())
+        database.start_automatic_updates()
+        return database
+    return NewsDatabase(analysis_llm=get_llm(), read_only=True)
+
+
+@st.cache_resource(show_spinner=False)
+def get_background_executor():
+    # Runs follow-up question generation while the user reads the summary.
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="follow-up")
+
+
+@st.cache_resource(show_spinner=False)
+def get_admission_controller():
+    return AdmissionController(
+        rate_per_minute=LLM_REQUESTS_PER_MINUTE,
+        burst=LLM_BURST,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_queue=LLM_MAX_QUEUE,
+        max_wait=LLM_MAX_WAIT_SECONDS,
+    )
 
-db = NewsDatabase()
-db.start_automatic_updates()
 
-google_api_key = os.getenv("GOOGLE_API_KEY")
-if not google_api_key:
-    raise ValueError("Please set the google_api_key environment variable")
-
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash", google_api_key=google_api_key, temperature=0.2
-)
+llm = get_llm()
+db = get_database()
+background = get_background_executor()
+admission = get_admission_controller()
 
 custom_css = """
     <style>
@@ -74,6 +128,12 @@ def initialize_session_state():
         st.session_state.generation_count = 0
     if "generation_timestamps" not in st.session_state:
         st.session_state.generation_timestamps = []
+    if "pending_summary" not in st.session_state:
+        st.session_state.pending_summary = None
+    if "follow_up_future" not in st.session_state:
+        st.session_state.follow_up_future = None
+    if "memory" not in st.session_state:
+        st.session_state.memory = None
 
 
 def display_chat():
@@ -82,8 +142,25 @@ def display_chat():
             st.markdown(message["content"])
 
 
+def conversation_memory():
+    # Older turns are summarized on the background executor, through the
+    # admission queue like every other LLM call.
+    country, topic = st.session_state.country, st.session_state.topic
+    return ConversationMemory(
+        lambda summary, turns: summarize_conversation(
+            llm, country, topic, summary, turns, SUMMARY_MAX_WORDS
+        ),
+        lambda function, *args: background.submit(
+            admission.call, None, function, *args
+        ),
+    )
+
+
 def add_message(role, content):
     st.session_state.messages.append({"role": role, "content": content})
+    if st.session_state.memory is None:
+        st.session_state.memory = conversation_memory()
+    st.session_state.memory.add(role, content)
 
 
 def reset_chat():
@@ -92,6 +169,97 @@ def reset_chat():
     st.session_state.country = None
     st.session_state.topic = None
     st.session_state.analysis_generated = False
+    st.session_state.pending_summary = None
+    st.session_state.follow_up_future = None
+    st.session_state.memory = None
+
+
+def admitted_stream(key, factory):
+    """Stream an LLM response through the admission queue, showing the wait."""
+    notice = st.empty()
+
+    def show_position(ahead):
+        if ahead:
+            notice.info(f"Waiting in line: {ahead} request(s) ahead of yours...")
+        else:
+            notice.info("Your request is next...")
+
+    waiting = True
+    for chunk in admission.stream(key, factory, on_wait=show_position):
+        if waiting:
+            notice.empty()
+            waiting = False
+        yield chunk
+    notice.empty()
+
+
+def show_analysis(analysis):
+    add_message("assistant", analysis["summary"])
+    st.session_state.sources = analysis["sources"]
+    st.session_state.analysis_generated = True
+    add_message("assistant", analysis["follow_up"])
+
+
+def stream_pending_summary():
+    pending = st.session_state.pending_summary
+    st.session_state.pending_summary = None
+
+    country, topic = st.session_state.country, st.session_state.topic
+    try:
+        with st.chat_message("assistant"):
+            # Readers asking for the same analysis at once share one stream.
+            summary = st.write_stream(
+                admitted_stream(
+                    ("summary", country, topic, pending["generation"]),
+                    lambda: stream_summary(llm, country, topic, pending["documents"]),
+                )
+            )
+    except AdmissionRejected:
+        # Turned away before any model call; it does not count against the
+        # session's limit.
+        if st.session_state.generation_timestamps:
+            st.session_state.generation_timestamps.pop()
+        st.session_state.sources = []
+        add_message("assistant", BUSY_MESSAGE)
+        st.rerun()
+
+    if summary.strip():
+        add_message("assistant", summary)
+        st.session_state.analysis_generated = True
+        st.session_state.follow_up_future = background.submit(
+            admission.call,
+            ("follow_up", country, topic, pending["generation"]),
+            finish_analysis,
+            llm,
+            db.analysis_cache,
+            st.session_state.country,
+            st.session_state.topic,
+            pending["generation"],
+            summary,
+            st.session_state.sources,
+        )
+    else:
+        st.session_state.analysis_generated = False
+        st.session_state.sources = []
+        add_message("assistant", "Failed to generate a summary. Please try again.")
+    st.rerun()
+
+
+@st.fragment(run_every=1)
+def show_follow_up_when_ready():
+    future = st.session_state.follow_up_future
+    if future is None:
+        return
+    if not future.done():
+        st.caption("Generating follow-up questions...")
+        return
+
+    st.session_state.follow_up_future = None
+    try:
+        add_message("assistant", future.result())
+    except Exception as e:
+        print(f"Error generating follow-up questions: {e}")
+    st.rerun()
 
 
 def update_generation_count(cooldown_minutes=60):
@@ -104,12 +272,6 @@ def update_generation_count(cooldown_minutes=60):
     st.session_state.generation_count = len(st.session_state.generation_timestamps)
 
 
-def get_chat_history():
-    return "\n".join(
-        [f"{m['role']}: {m['content']}" for m in st.session_state.messages]
-    )
-
-
 def get_last_update():
     try:
         with open("chroma_db/last_update.txt", "r") as f:
@@ -156,7 +318,12 @@ def main():
     selected_topic = st.sidebar.selectbox("Select a topic:", topics)
     selected_topic = selected_topic.split(" ")[0].lower()
 
-    button_disabled = st.session_state.generation_count >= GENERATION_LIMIT
+    # Cached analyses cost no LLM call, so they are exempt from the limit.
+    cached_analysis = db.analysis_cache.get(country, selected_topic, db.generation())
+    button_disabled = (
+        st.session_state.generation_count >= GENERATION_LIMIT
+        and cached_analysis is None
+    )
 
     if st.sidebar.button(
         "Analyze news",
@@ -164,55 +331,35 @@ def main():
         type="primary",
         disabled=button_disabled,
     ):
-        if st.session_state.generation_count < GENERATION_LIMIT:
+        if (
+            cached_analysis is not None
+            or st.session_state.generation_count < GENERATION_LIMIT
+        ):
             reset_chat()
             st.session_state.country = country
             st.session_state.topic = selected_topic
-            st.session_state.generation_timestamps.append(time.time())
-            st.session_state.generation_count += 1
-            with st.spinner("Generating summary..."):
-                query = f"{country} {selected_topic} news"
-                relevant_documents = db.search(query, country, selected_topic, k=7)
+            if cached_analysis is not None:
+                show_analysis(cached_analysis)
+            else:
+                st.session_state.generation_timestamps.append(time.time())
+                st.session_state.generation_count += 1
+                generation = db.generation()
+                with st.spinner("Retrieving articles..."):
+                    documents = retrieve_documents(db, country, selected_topic)
 
-                if not relevant_documents:
+                if not documents:
                     st.session_state.analysis_generated = False
                     add_message(
                         "assistant",
                         "No relevant documents found. Please try a different country or topic.",
                     )
                 else:
-                    context = "\n\n".join(
-                        [
-                            f"Article {i+1}:\n{doc.page_content}..."
-                            for i, doc in enumerate(relevant_documents)
-                        ]
-                    )
-
-                    main_chain = MAIN_SYSTEM_PROMPT | llm
-                    summary = main_chain.invoke(
-                        {
-                            "country": country,
-                            "topic": selected_topic,
-                            "context": context,
-                        }
-                    )
-
-                    if summary.content.strip():
-                        add_message("assistant", summary.content)
-                        st.session_state.sources = [
-                            doc.metadata["source"] for doc in relevant_documents
-                        ]
-                        st.session_state.analysis_generated = True
-
-                        questions_chain = FOLLOW_UP_QUESTIONS_PROMPT | llm
-                        follow_up = questions_chain.invoke({"summary": summary.content})
-                        add_message("assistant", follow_up.content)
-                    else:
-                        st.session_state.analysis_generated = False
-                        add_message(
-                            "assistant",
-                            "Failed to generate a summary. Please try again.",
-                        )
+                    # The summary is streamed below the chat history.
+                    st.session_state.sources = source_urls(documents)
+                    st.session_state.pending_summary = {
+                        "documents": documents,
+                        "generation": generation,
+                    }
 
     if st.session_state.generation_count >= GENERATION_LIMIT:
         next_available = min(st.session_state.generation_timestamps) + (
@@ -239,6 +386,11 @@ def main():
 
     display_chat()
 
+    if st.session_state.pending_summary:
+        stream_pending_summary()
+    if st.session_state.follow_up_future is not None:
+        show_follow_up_when_ready()
+
     if st.session_state.analysis_generated:
         user_input = st.chat_input(
             "Ask a follow-up question or type 'new analysis' to start over"
@@ -249,18 +401,31 @@ def main():
                 st.rerun()
             else:
                 add_message("human", user_input)
-                with st.spinner("Generating response..."):
-                    chat_history = get_chat_history()
-                    response_chain = CHAT_RESPONSE_PROMPT | llm
-                    response = response_chain.invoke(
-                        {
-                            "country": st.session_state.country,
-                            "topic": st.session_state.topic,
-                            "user_input": user_input,
-                            "chat_history": chat_history,
-                        }
-                    )
-                    add_message("assistant", response.content)
+                with st.chat_message("human"):
+                    st.markdown(user_input)
+
+                chat_history = st.session_state.memory.history()
+                passages = retrieve_passages(
+                    db, user_input, st.session_state.country, st.session_state.topic
+                )
+                try:
+                    with st.chat_message("assistant"):
+                        response = st.write_stream(
+                            admitted_stream(
+                                None,
+                                lambda: stream_chat_response(
+                                    llm,
+                                    st.session_state.country,
+                                    st.session_state.topic,
+                                    user_input,
+                                    chat_history,
+                                    passages,
+                                ),
+                            )
+                        )
+                except AdmissionRejected:
+                    response = BUSY_MESSAGE
+                add_message("assistant", response)
                 st.rerun()
 
     st.markdown(
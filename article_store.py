@@ -0,0 +1,199 @@
+# article_store.py
+
+import hashlib
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zlib is always there, at a somewhat lower ratio
+    zstandard = None
+
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+# Decompressed blocks kept in memory; one block holds one article.
+BLOCK_CACHE_SIZE = 256
+
+
+def text_ref(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if zstandard is None:
+        raise RuntimeError("This article store needs the zstandard package")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+class ArticleStore:
+    """Compressed, content-addressed store of chunk text, in SQLite.
+
+    The chunks of one article are concatenated and compressed together as a
+    block (zstd, or zlib without the ``zstandard`` package), and an offset
+    index maps each text's reference, the SHA-1 of the text, to its slice of
+    the block. Text that is already stored is not stored again. The vector
+    store keeps only the reference, and reading a few chunks decompresses
+    only their articles' blocks.
+
+    Nothing is deleted on write; ``retain`` drops the texts that are no longer
+    referenced, which compaction does.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blocks (
+                    block_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    codec TEXT NOT NULL,
+                    data BLOB NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS texts (
+                    ref TEXT PRIMARY KEY,
+                    block_id INTEGER NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS texts_block ON texts (block_id)"
+            )
+
+    def put_many(self, articles: Iterable[List[str]]) -> List[List[str]]:
+        """Store the chunk texts of each article; return their references."""
+        refs = []
+        with self._lock, self._conn:
+            for texts in articles:
+                article_refs = [text_ref(text) for text in texts]
+                refs.append(article_refs)
+                new = dict(zip(article_refs, texts))
+                for ref in self._existing(list(new)):
+                    del new[ref]
+                if new:
+                    self._write_block(new)
+        return refs
+
+    def _existing(self, refs: List[str]) -> Set[str]:
+        # Caller holds the lock.
+        found = set()
+        for start in range(0, len(refs), 500):
+            chunk = refs[start : start + 500]
+            found.update(
+                row[0]
+                for row in self._conn.execute(
+                    f"SELECT ref FROM texts WHERE ref IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        return found
+
+    def _write_block(self, texts: Dict[str, str]):
+        # Caller holds the lock and an open transaction.
+        entries, parts, offset = [], [], 0
+        for ref, text in texts.items():
+            data = text.encode("utf-8")
+            entries.append((ref, offset, len(data)))
+            parts.append(data)
+            offset += len(data)
+        codec, compressed = _compress(b"".join(parts))
+        block_id = self._conn.execute(
+            "INSERT INTO blocks (codec, data) VALUES (?, ?)", (codec, compressed)
+        ).lastrowid
+        self._conn.executemany(
+            "INSERT INTO texts VALUES (?, ?, ?, ?)",
+            [(ref, block_id, start, length) for ref, start, length in entries],
+        )
+
+    def _block(self, block_id: int) -> bytes:
+        # Caller holds the lock.
+        data = self._cache.get(block_id)
+        if data is not None:
+            self._cache.move_to_end(block_id)
+            return data
+        codec, compressed = self._conn.execute(
+            "SELECT codec, data FROM blocks WHERE block_id = ?", (block_id,)
+        ).fetchone()
+        data = _decompress(codec, compressed)
+        self._cache[block_id] = data
+        if len(self._cache) > BLOCK_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return data
+
+    def get_many(self, refs: List[str]) -> Dict[str, str]:
+        """Return the stored texts of ``refs``; unknown references are left out."""
+        refs = list(dict.fromkeys(refs))
+        texts = {}
+        with self._lock:
+            for start in range(0, len(refs), 500):
+                chunk = refs[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT ref, block_id, offset, length FROM texts "
+                    f"WHERE ref IN ({','.join('?' * len(chunk))}) ORDER BY block_id",
+                    chunk,
+                ).fetchall()
+                for ref, block_id, offset, length in rows:
+                    data = self._block(block_id)
+                    texts[ref] = data[offset : offset + length].decode("utf-8")
+        return texts
+
+    def retain(self, refs: Set[str]) -> int:
+        """Drop every text not in ``refs``; return how many were dropped.
+
+        Blocks that lost texts are recompressed with the rest, so dropped
+        text frees its space.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT ref, block_id FROM texts").fetchall()
+            dead = [(ref, block_id) for ref, block_id in rows if ref not in refs]
+            if not dead:
+                return 0
+            affected = {block_id for _, block_id in dead}
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM texts WHERE ref = ?", [(ref,) for ref, _ in dead]
+                )
+                for block_id in affected:
+                    data = self._block(block_id)
+                    live = {
+                        ref: data[offset : offset + length].decode("utf-8")
+                        for ref, offset, length in self._conn.execute(
+                            "SELECT ref, offset, length FROM texts WHERE block_id = ?",
+                            (block_id,),
+                        ).fetchall()
+                    }
+                    self._conn.execute(
+                        "DELETE FROM texts WHERE block_id = ?", (block_id,)
+                    )
+                    self._conn.execute(
+                        "DELETE FROM blocks WHERE block_id = ?", (block_id,)
+                    )
+                    self._cache.pop(block_id, None)
+                    if live:
+                        self._write_block(live)
+            self._conn.execute("VACUUM")
+        return len(dead)
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+            self._conn.close()
@@ -0,0 +1,114 @@
+# benchmarks/corpus.py
+
+import glob
+import os
+import random
+from typing import Dict, List, Optional
+
+WORDS = (
+    "government minister election policy market growth inflation league match "
+    "season player coach film festival studio research scientists study patients "
+    "hospital vaccine technology startup software device network climate energy "
+    "budget trade report officials announced according statement percent million "
+    "billion week month year city country national international local public"
+).split()
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script>window.dataLayer = [{script}];</script>
+<style>body {{ font-family: sans-serif; }}</style>
+</head>
+<body>
+<header class="masthead"><nav class="navbar">{nav}</nav></header>
+<div class="cookie-consent">We use cookies to improve your experience.</div>
+<main>
+<article>
+<h1>{title}</h1>
+{paragraphs}
+</article>
+<aside class="related">{related}</aside>
+</main>
+<div class="share-bar">Share on social media</div>
+<footer class="footer">Copyright {site}. All rights reserved. {nav}</footer>
+</body>
+</html>
+"""
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(8, 20))
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_page(rng: random.Random, site: str, paragraphs: int) -> str:
+    """Build a news-like page with realistic boilerplate around the article."""
+    title = " ".join(rng.choices(WORDS, k=6)).title()
+    body = "\n".join(
+        f"<p>{' '.join(_sentence(rng) for _ in range(rng.randint(3, 7)))}</p>"
+        for _ in range(paragraphs)
+    )
+    nav = " ".join(f'<a href="/{word}">{word.title()}</a>' for word in WORDS[:12])
+    related = "".join(
+        f'<a href="/story/{rng.randint(1, 10**6)}">{_sentence(rng)}</a>'
+        for _ in range(5)
+    )
+    return PAGE_TEMPLATE.format(
+        title=title,
+        script=",".join(str(rng.random()) for _ in range(50)),
+        nav=nav,
+        paragraphs=body,
+        related=related,
+        site=site,
+    )
+
+
+def build_corpus(
+    pages: int, seed: int = 0, directory: Optional[str] = None
+) -> Dict[str, str]:
+    """Return ``{path: html}`` for the stand-in news sites.
+
+    Pages are read from ``directory`` (recorded ``*.html`` files) when given,
+    cycling through them to reach ``pages``; otherwise they are generated
+    deterministically from ``seed`` with 3-30 paragraphs each.
+    """
+    rng = random.Random(seed)
+    recorded: List[str] = []
+    if directory:
+        for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                recorded.append(f.read())
+        if not recorded:
+            raise ValueError(f"No .html files found in {directory}")
+
+    corpus = {}
+    for i in range(pages):
+        if recorded:
+            html = recorded[i % len(recorded)]
+        else:
+            html = synthetic_page(rng, f"site{i}", rng.randint(3, 30))
+        corpus[f"/article/{i}.html"] = html
+    return corpus
+
+
+def synthetic_articles(
+    count: int, countries: List[str], topics: List[str], seed: int = 0
+) -> List[Dict[str, str]]:
+    """Return already-extracted articles spread evenly over every country/topic."""
+    rng = random.Random(seed)
+    partitions = [(country, topic) for country in countries for topic in topics]
+    articles = []
+    for i in range(count):
+        country, topic = partitions[i % len(partitions)]
+        content = " ".join(_sentence(rng) for _ in range(rng.randint(15, 120)))
+        articles.append(
+            {
+                "url": f"https://bench{i % 50}.example/{country}/{topic}/{i}",
+                "content": f"{topic} news from {country}. {content}",
+                "country": country,
+                "topic": topic,
+            }
+        )
+    return articles
@@ -0,0 +1,40 @@
+# benchmarks/fakes.py
+
+from typing import Dict, List
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+FAKE_SUMMARY = (
+    "■ $~Summary$\n\nA deterministic benchmark summary of the retrieved articles. " * 20
+)
+FAKE_FOLLOW_UP = "1. What happens next?\n2. Who is affected?\n3. Why does it matter?"
+
+
+def discovery_fixture(
+    base_urls: List[str],
+    paths: List[str],
+    countries: List[str],
+    topics: List[str],
+    per_topic: int,
+) -> Dict[str, List[str]]:
+    """Hand out corpus URLs round-robin to every country/topic.
+
+    The result maps ``"country|topic"`` to URLs, as ``FixtureDiscovery``
+    expects. Pages are spread over all stand-in sites.
+    """
+    fixture = {}
+    next_url = 0
+    for country in countries:
+        for topic in topics:
+            urls = []
+            for _ in range(per_topic):
+                base = base_urls[next_url % len(base_urls)]
+                urls.append(base + paths[next_url % len(paths)])
+                next_url += 1
+            fixture[f"{country}|{topic}"] = urls
+    return fixture
+
+
+def fake_llm() -> FakeListChatModel:
+    """Deterministic chat model alternating a summary and follow-up questions."""
+    return FakeListChatModel(responses=[FAKE_SUMMARY, FAKE_FOLLOW_UP])
@@ -0,0 +1,397 @@
+# benchmarks/run.py
+"""Offline benchmarks for the scrape -> embed -> index -> retrieve pipeline.
+
+Run from the repository root:
+
+    python -m benchmarks.run --fake-embeddings
+
+Pages come from a local stand-in HTTP server, article URLs from a fixed discovery backend and
+analyses from a deterministic fake LLM, so nothing leaves the machine. Without
+``--fake-embeddings`` the configured sentence-transformers model is used and
+embedding throughput is real.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import database
+from analysis import generate_analysis
+from benchmarks.corpus import build_corpus, synthetic_articles
+from benchmarks.fakes import discovery_fixture, fake_llm
+from benchmarks.server import CorpusServer
+from discovery import FixtureDiscovery
+from embeddings import create_embeddings, recall_at_k, tune_batch_size
+from extraction import extract_main_text
+from scraper import NewsScraper
+
+QUERIES = [
+    "{country} {topic} news",
+    "latest {topic} report in {country}",
+    "officials announced new {topic} policy",
+    "market growth and inflation",
+    "research study results",
+]
+
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    milliseconds = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+        "mean_ms": float(milliseconds.mean()),
+    }
+
+
+def timed(function: Callable, repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def offline_discovery(server: CorpusServer, corpus: Dict[str, str], args):
+    return FixtureDiscovery(
+        discovery_fixture(
+            server.base_urls,
+            list(corpus),
+            args.countries,
+            args.topics,
+            args.urls_per_topic,
+        )
+    )
+
+
+def bench_embeddings(args) -> Dict:
+    """Load time, throughput and recall@10 against torch of each backend.
+
+    The first backend that needs torch also pays for importing it, as a cold
+    process would.
+    """
+    articles = synthetic_articles(
+        args.embedding_documents, args.countries, args.topics, seed=args.seed
+    )
+    documents = [
+        article["content"][: database.cfg["CHUNK_SIZE"]] for article in articles
+    ]
+    queries = [
+        query.format(country=country, topic=topic)
+        for query in QUERIES
+        for country in args.countries
+        for topic in args.topics
+    ]
+    results, models = {}, {}
+    for backend in args.embedding_backends.split(","):
+        start = time.perf_counter()
+        models[backend] = create_embeddings(
+            database.cfg["EMBEDDING_MODEL"],
+            backend,
+            threads=database.cfg["EMBEDDING_THREADS"],
+            onnx_path=database.cfg["EMBEDDING_ONNX_MODEL"],
+        )
+        load = time.perf_counter() - start
+        batch_size = tune_batch_size(models[backend], documents[:128])
+        start = time.perf_counter()
+        for offset in range(0, len(documents), batch_size):
+            models[backend].embed_documents(documents[offset : offset + batch_size])
+        elapsed = time.perf_counter() - start
+        results[backend] = {
+            "load_s": load,
+            "batch_size": batch_size,
+            "docs_per_s": len(documents) / elapsed,
+        }
+    reference = models.get("torch") or create_embeddings(
+        database.cfg["EMBEDDING_MODEL"], "torch"
+    )
+    for backend, model in models.items():
+        results[backend]["recall_at_10"] = recall_at_k(
+            reference, model, documents, queries
+        )
+    return results
+
+
+def bench_extraction(corpus: Dict[str, str], workers: int) -> Dict:
+    pages = list(corpus.values())
+    start = time.perf_counter()
+    for html in pages:
+        extract_main_text(html, database.cfg["HTML_PARSER"])
+    inline = time.perf_counter() - start
+    result = {"pages": len(pages), "inline_pages_per_s": len(pages) / inline}
+
+    if workers > 0:
+        scraper = NewsScraper(
+            extraction_workers=workers,
+            parser=database.cfg["HTML_PARSER"],
+        )
+        scraper.open_extraction_pool()
+
+        async def extract_all():
+            await asyncio.gather(*(scraper.extract_text_async(html) for html in pages))
+
+        try:
+            start = time.perf_counter()
+            asyncio.run(extract_all())
+            pooled = time.perf_counter() - start
+        finally:
+            scraper.close_extraction_pool()
+        result["pool_workers"] = workers
+        result["pool_pages_per_s"] = len(pages) / pooled
+    return result
+
+
+def bench_fetch(server: CorpusServer, corpus: Dict[str, str], args) -> Dict:
+    jobs = [(country, topic) for country in args.countries for topic in args.topics]
+    scraper = NewsScraper(
+        discovery=offline_discovery(server, corpus, args),
+        per_domain_concurrency=args.per_domain_concurrency,
+        per_domain_delay=(0.0, 0.0),
+        extraction_workers=args.extraction_workers,
+        parser=database.cfg["HTML_PARSER"],
+        max_bytes=database.cfg["MAX_PAGE_BYTES"],
+    )
+
+    async def scrape_all():
+        pages = 0
+        async for _, _, articles in scraper.scrape_jobs(
+            jobs, urls_per_topic=args.urls_per_topic
+        ):
+            pages += len(articles)
+        return pages
+
+    scraper.open_extraction_pool()
+    try:
+        start = time.perf_counter()
+        pages = asyncio.run(scrape_all())
+        elapsed = time.perf_counter() - start
+    finally:
+        scraper.close_extraction_pool()
+    return {
+        "jobs": len(jobs),
+        "pages": pages,
+        "seconds": elapsed,
+        "pages_per_s": pages / elapsed,
+    }
+
+
+def bench_refresh(db: database.NewsDatabase, server, corpus, args) -> Dict:
+    """Time a whole update_database run: scrape, journal, embed, index, publish."""
+    db.scraper = NewsScraper(
+        discovery=offline_discovery(server, corpus, args),
+        per_domain_concurrency=args.per_domain_concurrency,
+        per_domain_delay=(0.0, 0.0),
+        extraction_workers=args.extraction_workers,
+        parser=database.cfg["HTML_PARSER"],
+        http_cache=db.scraper.http_cache,
+    )
+    start = time.perf_counter()
+    db.update_database()
+    elapsed = time.perf_counter() - start
+    # Same pages again: conditional GETs answered 304 from the HTTP cache.
+    start = time.perf_counter()
+    db.update_database()
+    return {"seconds": elapsed, "unchanged_seconds": time.perf_counter() - start}
+
+
+def disk_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+def bench_ingest(db: database.NewsDatabase, articles: List[Dict[str, str]]) -> Dict:
+    batch_size = database.cfg["INGEST_BATCH_SIZE"]
+    chunks_before = len(db.vector_store.get(include=[])["ids"])
+    start = time.perf_counter()
+    written = 0
+    for i in range(0, len(articles), batch_size):
+        written += db.add_articles(articles[i : i + batch_size])
+    elapsed = time.perf_counter() - start
+    chunks = len(db.vector_store.get(include=[])["ids"]) - chunks_before
+    return {
+        "articles": len(articles),
+        "written": written,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "docs_per_s": written / elapsed if elapsed else 0.0,
+        "chunks_per_s": chunks / elapsed if elapsed else 0.0,
+        "disk_bytes": disk_bytes(db.persist_directory),
+    }
+
+
+def bench_search(db: database.NewsDatabase, args, rng: random.Random) -> Dict:
+    def query():
+        country = rng.choice(args.countries)
+        topic = rng.choice(args.topics)
+        text = rng.choice(QUERIES).format(country=country, topic=topic)
+        return text, country, topic
+
+    results = {}
+    for name, run in (
+        ("search", lambda q, c, t: db.search(q, c, t, k=10)),
+        ("search_diverse", lambda q, c, t: db.search(q, c, t, k=10, diverse=True)),
+        ("hybrid_search", lambda q, c, t: db.hybrid_search(q, c, t, k=10)),
+    ):
+        results[name] = latency_stats(timed(lambda: run(*query()), args.search_repeats))
+    return results
+
+
+def bench_analyze(db: database.NewsDatabase, args, rng: random.Random) -> Dict:
+    llm = fake_llm()
+
+    def analyze():
+        generate_analysis(db, llm, rng.choice(args.countries), rng.choice(args.topics))
+
+    return latency_stats(timed(analyze, args.analyze_repeats))
+
+
+def print_report(results: Dict):
+    if "embeddings" in results:
+        print("\nEmbedding backends")
+        for backend, entry in results["embeddings"].items():
+            print(
+                f"  {backend + ':':15}{entry['docs_per_s']:10.1f} docs/s "
+                f"(batch {entry['batch_size']}), loaded in {entry['load_s']:.2f} s, "
+                f"recall@10 {entry['recall_at_10']:.3f}"
+            )
+    extraction = results["extraction"]
+    print(f"\nExtraction ({extraction['pages']} pages)")
+    print(f"  inline:        {extraction['inline_pages_per_s']:10.1f} pages/s")
+    if "pool_pages_per_s" in extraction:
+        print(
+            f"  pool ({extraction['pool_workers']} procs): "
+            f"{extraction['pool_pages_per_s']:10.1f} pages/s"
+        )
+    fetch = results["fetch"]
+    print(f"\nFetch + extract ({fetch['jobs']} jobs, {fetch['pages']} pages)")
+    print(f"  async scraper: {fetch['pages_per_s']:10.1f} pages/s")
+    refresh = results["refresh"]
+    print(f"\nFull refresh: {refresh['seconds']:.2f} s")
+    print(f"Unchanged refresh: {refresh['unchanged_seconds']:.2f} s")
+    for size, entry in results["corpus_sizes"].items():
+        ingest = entry["ingest"]
+        print(f"\nCorpus of {size} articles")
+        print(
+            f"  ingest:        {ingest['docs_per_s']:10.1f} docs/s "
+            f"({ingest['chunks_per_s']:.1f} chunks/s), "
+            f"{ingest['disk_bytes'] / 1e6:.1f} MB on disk"
+        )
+        for name, stats in entry["search"].items():
+            print(
+                f"  {name + ':':15}{stats['p50_ms']:10.2f} ms p50 "
+                f"{stats['p99_ms']:10.2f} ms p99"
+            )
+        analyze = entry["analyze"]
+        print(
+            f"  {'analyze:':15}{analyze['p50_ms']:10.2f} ms p50 "
+            f"{analyze['p99_ms']:10.2f} ms p99"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pages", type=int, default=200, help="pages in the corpus")
+    parser.add_argument(
+        "--corpus-dir", help="directory of recorded .html pages to serve"
+    )
+    parser.add_argument("--sites", type=int, default=8, help="stand-in domains")
+    parser.add_argument(
+        "--sizes",
+        default="250,1000,4000",
+        help="comma-separated corpus sizes (articles) for search/analyze",
+    )
+    parser.add_argument("--search-repeats", type=int, default=200)
+    parser.add_argument("--analyze-repeats", type=int, default=20)
+    parser.add_argument("--urls-per-topic", type=int, default=10)
+    parser.add_argument("--per-domain-concurrency", type=int, default=8)
+    parser.add_argument(
+        "--extraction-workers",
+        type=int,
+        default=database.cfg["EXTRACTION_WORKERS"],
+    )
+    parser.add_argument(
+        "--backend", choices=["chroma", "faiss"], default=database.cfg["VECTOR_BACKEND"]
+    )
+    parser.add_argument(
+        "--fake-embeddings",
+        action="store_true",
+        help="use deterministic fake vectors instead of the embedding model",
+    )
+    parser.add_argument(
+        "--embedding-backends",
+        help="comma-separated embedding backends to compare (torch,int8,onnx)",
+    )
+    parser.add_argument("--embedding-documents", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    args.countries = database.cfg["COUNTRIES"]
+    args.topics = database.cfg["TOPICS"]
+
+    workdir = tempfile.mkdtemp(prefix="newsllm-bench-")
+    for name in ("refresh_db", "search_db"):
+        os.makedirs(os.path.join(workdir, name))
+    database.cfg.update(
+        VECTOR_BACKEND=args.backend,
+        EMBEDDING_CACHE_DIR=os.path.join(workdir, "embedding_cache"),
+        PREWARM_ANALYSIS=False,
+    )
+    embeddings = DeterministicFakeEmbedding(size=384) if args.fake_embeddings else None
+    rng = random.Random(args.seed)
+    corpus = build_corpus(args.pages, seed=args.seed, directory=args.corpus_dir)
+    results: Dict = {"config": {k: v for k, v in vars(args).items()}}
+
+    try:
+        if args.embedding_backends:
+            results["embeddings"] = bench_embeddings(args)
+        results["extraction"] = bench_extraction(corpus, args.extraction_workers)
+        with CorpusServer(corpus, sites=args.sites) as server:
+            results["fetch"] = bench_fetch(server, corpus, args)
+            refresh_db = database.NewsDatabase(
+                os.path.join(workdir, "refresh_db"), embeddings=embeddings
+            )
+            results["refresh"] = bench_refresh(refresh_db, server, corpus, args)
+
+        # Ingest in place: per-call snapshot copies would dominate the timing
+        # and are measured by the full refresh above.
+        database.cfg["SNAPSHOT_BUILDS"] = False
+        db = database.NewsDatabase(
+            os.path.join(workdir, "search_db"), embeddings=embeddings
+        )
+        sizes = sorted(int(size) for size in args.sizes.split(","))
+        articles = synthetic_articles(
+            sizes[-1], args.countries, args.topics, seed=args.seed
+        )
+        results["corpus_sizes"] = {}
+        loaded = 0
+        for size in sizes:
+            ingest = bench_ingest(db, articles[loaded:size])
+            loaded = size
+            results["corpus_sizes"][size] = {
+                "ingest": ingest,
+                "search": bench_search(db, args, rng),
+                "analyze": bench_analyze(db, args, rng),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/server.py
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+
+class _CorpusHandler(BaseHTTPRequestHandler):
+    corpus: Dict[str, bytes] = {}
+
+    def do_GET(self):
+        body = self.corpus.get(self.path.split("?")[0])
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+class CorpusServer:
+    """Serve a corpus from memory as several local stand-in news sites.
+
+    Each site is a separate port, so the scraper's per-domain politeness and
+    connection pooling behave as they would across real domains.
+    """
+
+    def __init__(self, corpus: Dict[str, str], sites: int = 8):
+        handler = type(
+            "CorpusHandler",
+            (_CorpusHandler,),
+            {"corpus": {path: html.encode("utf-8") for path, html in corpus.items()}},
+        )
+        self._servers = [
+            ThreadingHTTPServer(("127.0.0.1", 0), handler) for _ in range(sites)
+        ]
+        for server in self._servers:
+            server.daemon_threads = True
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def base_urls(self) -> List[str]:
+        return [f"http://127.0.0.1:{server.server_port}" for server in self._servers]
+
+    def __enter__(self) -> "CorpusServer":
+        for server in self._servers:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc_info):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
@@ -1,17 +1,56 @@
 # database.py
 
+import argparse
+import asyncio
+import atexit
+import contextvars
+import fcntl
 import os
+import shutil
+import sqlite3
 import threading
 import time
-from datetime import datetime
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Tuple
 import logging
+import numpy as np
 import schedule
+from chromadb.api.shared_system_client import SharedSystemClient
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain_community.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
 from langchain_core.documents import Document
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from opentelemetry import trace
+from analysis import AnalysisCache, create_llm, prewarm_analyses
+from article_store import ArticleStore
+from dedup import DedupIndex, article_id
+from discovery import (
+    CachedDiscovery,
+    DiscoveryBackend,
+    FeedDiscovery,
+    FixtureDiscovery,
+    GoogleSearchDiscovery,
+)
+from dotenv import load_dotenv
+from embeddings import (
+    CachedEmbeddings,
+    EmbeddingStore,
+    cache_model_name,
+    create_embeddings,
+    tune_batch_size,
+)
+from faiss_store import PartitionedFaissStore
+from http_cache import HttpCache
+from journal import RefreshJournal
+from lexical import LexicalIndex
 from scraper import NewsScraper
+from telemetry import VECTOR_STORE_DURATION, setup_telemetry, timed_span, tracer
 
 cfg = {
     "COUNTRIES": ["USA", "UK", "Pakistan", "International"],
@@ -24,6 +63,110 @@ cfg = {
         "science",
         "technology",
     ],
+    # Drive all country x topic jobs through one asyncio event loop with
+    # per-domain politeness instead of one thread per job.
+    "ASYNC_SCRAPING": True,
+    "PER_DOMAIN_CONCURRENCY": 2,
+    "PER_DOMAIN_DELAY": (1.0, 3.0),
+    "URLS_PER_TOPIC": 10,
+    # Where article URLs come from: "google" searches every pair; "feeds"
+    # reads the RSS/Atom feeds listed in DISCOVERY_FEEDS (keyed like
+    # RETENTION_DAYS) concurrently and falls back to Google search for pairs
+    # without feeds; "fixture" replays the "country|topic" -> URLs JSON file
+    # at DISCOVERY_FIXTURE, for offline runs. Results are reused for the TTL.
+    "DISCOVERY_BACKEND": "google",
+    "DISCOVERY_FEEDS": {},
+    "DISCOVERY_FIXTURE": None,
+    "DISCOVERY_CACHE_TTL_MINUTES": 60,
+    # HTML extraction runs in a process pool during refreshes (0 = inline)
+    # with the fastest installed parser backend.
+    "EXTRACTION_WORKERS": min(4, os.cpu_count() or 1),
+    "HTML_PARSER": "lxml",
+    # Pages are streamed: non-HTML responses are rejected from their headers
+    # and downloads abort past MAX_PAGE_BYTES. With STREAMING_EXTRACTION the
+    # chunks go straight into an incremental parser instead of being buffered
+    # for the extraction pool, trading parallel parsing for lower peak memory.
+    "MAX_PAGE_BYTES": 2_000_000,
+    "STREAMING_EXTRACTION": False,
+    # Extracted text of pages served with ETag/Last-Modified is kept in
+    # persist/http_cache.sqlite3, so an unchanged page costs one conditional
+    # GET answered with 304. Least recently used pages go past this size.
+    "HTTP_CACHE": True,
+    "HTTP_CACHE_MAX_BYTES": 200_000_000,
+    # Bounded scrape workers (threaded mode) feeding a single ingest consumer
+    # that embeds and writes articles in batches as they arrive.
+    "SCRAPE_WORKERS": 4,
+    "INGEST_QUEUE_SIZE": 128,
+    "INGEST_BATCH_SIZE": 32,
+    "INGEST_FLUSH_SECONDS": 5.0,
+    # Embeddings are cached on disk by model name, backend and text hash.
+    "EMBEDDING_MODEL": "all-MiniLM-L6-v2",
+    # "torch", "int8" (dynamically quantized torch) or "onnx" (the model
+    # exported with python embeddings.py --export, run on onnxruntime). Check
+    # a backend's recall with python -m benchmarks.run --embedding-backends
+    # before switching. Each store records the model and backend it was
+    # embedded with and will not open under different ones.
+    "EMBEDDING_BACKEND": "torch",
+    "EMBEDDING_ONNX_MODEL": "./models/all-MiniLM-L6-v2/model.int8.onnx",
+    # CPU threads for inference; None leaves the library default.
+    "EMBEDDING_THREADS": None,
+    # "auto" measures the fastest batch size once per model, backend and
+    # machine, and remembers it in the embedding cache.
+    "EMBEDDING_BATCH_SIZE": "auto",
+    "EMBEDDING_CACHE_DIR": "./embedding_cache",
+    "EMBEDDING_CACHE_SIZE": 50_000,
+    # Articles are indexed as overlapping chunks (in characters) that fit the
+    # embedding model's 256-token input instead of being silently truncated.
+    "CHUNK_SIZE": 800,
+    "CHUNK_OVERLAP": 100,
+    # "chroma" keeps one global HNSW index filtered by metadata; "faiss" keeps
+    # memory-mapped vectors per (country, topic) partition (faiss_store.py).
+    "VECTOR_BACKEND": "chroma",
+    # search(diverse=True) re-ranks MMR_FETCH_FACTOR * k candidates; lower
+    # MMR_LAMBDA favours diversity over similarity.
+    "MMR_FETCH_FACTOR": 4,
+    "MMR_LAMBDA": 0.5,
+    # hybrid_search fuses HYBRID_FETCH_FACTOR * k candidates from each of the
+    # vector and BM25 indexes; HYBRID_ALPHA is the weight of the dense score.
+    "HYBRID_FETCH_FACTOR": 4,
+    "HYBRID_ALPHA": 0.5,
+    # Articles not seen in search results for longer than this are evicted.
+    # Keys may be "default", a country, a topic or a (country, topic) tuple;
+    # the most specific match wins.
+    "RETENTION_DAYS": {"default": 7},
+    "RETENTION_INTERVAL_HOURS": 24,
+    # Generate every country/topic analysis right after a refresh when the
+    # database was given an LLM, so app clicks are served from the cache.
+    "PREWARM_ANALYSIS": True,
+    "UPDATE_INTERVAL_HOURS": 24,
+    # How often the ingestion worker checks for due jobs and, on standby,
+    # whether it can take over leadership.
+    "WORKER_POLL_SECONDS": 60,
+    # Build each refresh into a copy of the served store and publish it with
+    # an atomic pointer swap, so readers never see a half-written index.
+    "SNAPSHOT_BUILDS": True,
+    "SNAPSHOTS_TO_KEEP": 2,
+    # Scraped results and ingest progress are journaled so an interrupted
+    # refresh resumes instead of starting over, unless the journal is older
+    # than this.
+    "REFRESH_JOURNAL_MAX_AGE_HOURS": 6,
+}
+
+COLLECTION_NAME = "langchain"
+# Raised by hnswlib (sic) when a filtered query cannot reach enough members.
+HNSW_UNREACHABLE_ERROR = "Cannot return the results in a contigious 2D array"
+
+# Files in the persist directory that belong to the deployment rather than to
+# a store, and are never copied into a snapshot.
+SHARED_FILES = {
+    "snapshots",
+    "CURRENT",
+    "PUBLISHED",
+    "last_update.txt",
+    "analysis_cache.sqlite3",
+    "ingest.lock",
+    "refresh",
+    "http_cache.sqlite3",
 }
 
 # Set up logging
@@ -33,108 +176,1316 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def create_discovery() -> DiscoveryBackend:
+    backend = cfg["DISCOVERY_BACKEND"]
+    if backend == "feeds":
+        discovery = FeedDiscovery(
+            cfg["DISCOVERY_FEEDS"], fallback=GoogleSearchDiscovery()
+        )
+    elif backend == "google":
+        discovery = GoogleSearchDiscovery()
+    elif backend == "fixture":
+        discovery = FixtureDiscovery(cfg["DISCOVERY_FIXTURE"])
+    else:
+        raise ValueError(f"Unknown discovery backend: {backend}")
+    if cfg["DISCOVERY_CACHE_TTL_MINUTES"]:
+        discovery = CachedDiscovery(discovery, cfg["DISCOVERY_CACHE_TTL_MINUTES"] * 60)
+    return discovery
+
+
+def _traced_store(operation: str):
+    return timed_span(
+        f"vector_store.{operation}",
+        VECTOR_STORE_DURATION,
+        **{"db.system": cfg["VECTOR_BACKEND"], "db.operation": operation},
+    )
+
+
+class LeaderLock:
+    """Leader election between ingestion processes over an advisory file lock.
+
+    Only the process holding the lock scrapes and writes. The operating system
+    releases the lock when the holder exits or dies, so a standby worker can
+    take over on its next attempt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Try to become the leader without blocking; True if this process leads."""
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def _write_atomically(path: str, text: str):
+    # Readers see either the old or the new content, never a partial write.
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _detach_vector_store(vector_store: VectorStore):
+    # Chroma caches one system per path for the life of the process, and a new
+    # client on the path would share it and its stale HNSW index. Forget it so
+    # the next client loads the index afresh; this one keeps working until it
+    # is closed.
+    if isinstance(vector_store, PartitionedFaissStore):
+        return
+    identifier = vector_store._client._identifier
+    system = vector_store._collection._client._system
+    if SharedSystemClient._identifier_to_system.get(identifier) is system:
+        del SharedSystemClient._identifier_to_system[identifier]
+
+
+def _close_vector_store(vector_store: VectorStore):
+    if isinstance(vector_store, PartitionedFaissStore):
+        vector_store.close()
+        return
+    # Stopping the system releases the in-memory HNSW index of the store.
+    _detach_vector_store(vector_store)
+    vector_store._collection._client._system.stop()
+
+
+class StoreSnapshot:
+    """The vector store and its side indexes living in one store directory."""
+
+    def __init__(
+        self,
+        directory: str,
+        vector_store: VectorStore,
+        dedup_index: DedupIndex,
+        lexical_index: LexicalIndex,
+        article_store: ArticleStore,
+    ):
+        self.directory = directory
+        self.vector_store = vector_store
+        self.dedup_index = dedup_index
+        self.lexical_index = lexical_index
+        self.article_store = article_store
+        # Set by write paths; an unmodified build is discarded, not published.
+        self.modified = False
+
+    def close(self):
+        _close_vector_store(self.vector_store)
+        self.dedup_index.close()
+        self.lexical_index.close()
+        self.article_store.close()
+
+
 class NewsDatabase:
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        self.embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    # One scheduler per process, shared by every instance.
+    _scheduler_lock = threading.Lock()
+    _scheduler_thread: Optional[threading.Thread] = None
+    _scheduler_stop: Optional[threading.Event] = None
+
+    def __init__(
+        self,
+        persist_directory: str = "./chroma_db",
+        analysis_llm: Optional[BaseChatModel] = None,
+        read_only: bool = False,
+        embeddings: Optional[Embeddings] = None,
+    ):
+        # ``embeddings`` replaces the configured model, e.g. with a fake in
+        # benchmarks; the cache keys vectors by its class name instead.
+        if embeddings is None:
+            start = time.perf_counter()
+            embeddings = create_embeddings(
+                cfg["EMBEDDING_MODEL"],
+                cfg["EMBEDDING_BACKEND"],
+                threads=cfg["EMBEDDING_THREADS"],
+                onnx_path=cfg["EMBEDDING_ONNX_MODEL"],
+            )
+            model_name = cache_model_name(
+                cfg["EMBEDDING_MODEL"], cfg["EMBEDDING_BACKEND"]
+            )
+            logger.info(
+                f"Loaded {model_name} embeddings in "
+                f"{time.perf_counter() - start:.1f} seconds"
+            )
+        else:
+            model_name = type(embeddings).__name__
+        # Recorded with every store; see _check_embedding_model.
+        self.embedding_model = model_name
+        embedding_store = EmbeddingStore(
+            cfg["EMBEDDING_CACHE_DIR"], max_entries=cfg["EMBEDDING_CACHE_SIZE"]
+        )
+        self.embedding_function = CachedEmbeddings(
+            embeddings,
+            model_name=model_name,
+            store=embedding_store,
+            batch_size=self._embedding_batch_size(
+                embeddings, embedding_store, model_name, read_only
+            ),
+        )
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=cfg["CHUNK_SIZE"], chunk_overlap=cfg["CHUNK_OVERLAP"]
+        )
         self.persist_directory = persist_directory
-        self.vector_store = self._load_or_create_vector_store()
-        self.scraper = NewsScraper()
+        self.read_only = read_only
+        self._serving = self._open_snapshot(self._current_directory())
+        # Write target of a refresh in progress; None while nothing is built.
+        self._building: Optional[StoreSnapshot] = None
+        # The previously served snapshot stays open until the next swap so
+        # queries already running against it can finish.
+        self._retired: Optional[StoreSnapshot] = None
+        self._swap_lock = threading.Lock()
+        # Checkpoints of the refresh in progress; None outside update_database.
+        self._journal: Optional[RefreshJournal] = None
+        # Read-only instances serve queries and never scrape.
+        self.scraper = None
+        if not read_only:
+            self.scraper = NewsScraper(
+                per_domain_concurrency=cfg["PER_DOMAIN_CONCURRENCY"],
+                per_domain_delay=cfg["PER_DOMAIN_DELAY"],
+                extraction_workers=cfg["EXTRACTION_WORKERS"],
+                parser=cfg["HTML_PARSER"],
+                max_bytes=cfg["MAX_PAGE_BYTES"],
+                streaming_extraction=cfg["STREAMING_EXTRACTION"],
+                http_cache=(
+                    HttpCache(
+                        os.path.join(persist_directory, "http_cache.sqlite3"),
+                        max_bytes=cfg["HTTP_CACHE_MAX_BYTES"],
+                    )
+                    if cfg["HTTP_CACHE"]
+                    else None
+                ),
+                discovery=create_discovery(),
+            )
+        self.leader_lock = LeaderLock(os.path.join(persist_directory, "ingest.lock"))
         self.last_update = self._get_last_update()
+        self._loaded_version = self._version()
+        self._last_retention: Optional[datetime] = None
+        self.analysis_llm = analysis_llm
+        self.analysis_cache = AnalysisCache(
+            os.path.join(persist_directory, "analysis_cache.sqlite3")
+        )
         self.countries = cfg["COUNTRIES"]
         self.topics = cfg["TOPICS"]
 
-    def _load_or_create_vector_store(self) -> VectorStore:
-        return Chroma(
-            persist_directory=self.persist_directory,
+    @staticmethod
+    def _embedding_batch_size(
+        embeddings: Embeddings,
+        store: EmbeddingStore,
+        model_name: str,
+        read_only: bool,
+    ) -> int:
+        batch_size = cfg["EMBEDDING_BATCH_SIZE"]
+        if batch_size != "auto":
+            return batch_size
+        if read_only:
+            # Readers only embed single queries.
+            return 32
+        setting = (
+            f"batch_size:{model_name}:"
+            f"{cfg['EMBEDDING_THREADS'] or 0}:{os.cpu_count()}"
+        )
+        batch_size = store.get_setting(setting)
+        if batch_size is None:
+            # Filler text of chunk lengths; speed depends on length, not wording.
+            sentence = "The latest news report on the economy and politics. "
+            filler = sentence * (cfg["CHUNK_SIZE"] // len(sentence) + 1)
+            texts = [filler[: cfg["CHUNK_SIZE"] * (4 - i % 4) // 4] for i in range(128)]
+            start = time.perf_counter()
+            batch_size = tune_batch_size(embeddings, texts)
+            store.put_setting(setting, batch_size)
+            logger.info(
+                f"Tuned the embedding batch size to {batch_size} in "
+                f"{time.perf_counter() - start:.1f} seconds"
+            )
+        return batch_size
+
+    @property
+    def vector_store(self) -> VectorStore:
+        return self._serving.vector_store
+
+    @property
+    def dedup_index(self) -> DedupIndex:
+        return self._serving.dedup_index
+
+    def _load_or_create_vector_store(self, directory: str) -> VectorStore:
+        if cfg["VECTOR_BACKEND"] == "faiss":
+            return PartitionedFaissStore(
+                os.path.join(directory, "faiss"),
+                self.embedding_function,
+                read_only=self.read_only,
+            )
+        vector_store = Chroma(
+            collection_name=COLLECTION_NAME,
+            persist_directory=directory,
             embedding_function=self.embedding_function,
         )
+        if not self.read_only and self._finish_interrupted_compaction(vector_store):
+            return self._load_or_create_vector_store(directory)
+        return vector_store
+
+    def _check_embedding_model(self, directory: str):
+        """Refuse a store whose vectors came from another model or backend.
+
+        Vectors of different models (or of one model on different backends)
+        are not comparable, so searching them with this process's embeddings
+        would return noise. Stores from before the model was recorded are
+        assumed to match and get it recorded on their first writable open.
+        """
+        path = os.path.join(directory, "embedding_model.txt")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                stored = f.read().strip()
+            if stored != self.embedding_model:
+                raise RuntimeError(
+                    f"The store in {directory} was embedded with {stored}, but "
+                    f"this process embeds with {self.embedding_model}. Set "
+                    f"EMBEDDING_MODEL and EMBEDDING_BACKEND back, or rebuild the "
+                    f"store with the new settings."
+                )
+        elif not self.read_only:
+            os.makedirs(directory, exist_ok=True)
+            _write_atomically(path, self.embedding_model)
+
+    def _open_snapshot(self, directory: str) -> StoreSnapshot:
+        self._check_embedding_model(directory)
+        return StoreSnapshot(
+            directory,
+            self._load_or_create_vector_store(directory),
+            DedupIndex(os.path.join(directory, "dedup.sqlite3")),
+            LexicalIndex(os.path.join(directory, "lexical.sqlite3")),
+            ArticleStore(os.path.join(directory, "articles.sqlite3")),
+        )
+
+    def _current_directory(self) -> str:
+        """Return the published store directory.
 
-    def _get_last_update(self) -> datetime:
+        Stores written before snapshot builds have no ``CURRENT`` pointer and
+        live directly in the persist directory.
+        """
+        pointer = os.path.join(self.persist_directory, "CURRENT")
+        if not os.path.exists(pointer):
+            return self.persist_directory
+        with open(pointer, "r") as f:
+            name = f.read().strip()
+        return os.path.join(self.persist_directory, "snapshots", name)
+
+    def _version(self) -> str:
+        # Retention publishes snapshots without starting a new generation.
+        return f"{self._current_directory()}|{self.generation()}"
+
+    @contextmanager
+    def _writing(
+        self,
+        refresh: bool = False,
+        build_name: Optional[str] = None,
+        keep_failed: bool = False,
+    ):
+        """Yield the store to write to and publish it when the block succeeds.
+
+        With ``SNAPSHOT_BUILDS`` the served store is copied into a new snapshot
+        directory first and only the copy is written. It is published if it was
+        modified (or ``refresh`` is set) and deleted if the block raises, so a
+        failed refresh leaves serving untouched. Nested blocks share the build
+        of the outermost one. ``refresh`` also starts a new data generation.
+
+        ``build_name`` continues an unpublished build left by an earlier
+        attempt, and ``keep_failed`` leaves a failed build on disk for that.
+        """
+        if self._building is not None:
+            yield self._building
+            return
+        if not cfg["SNAPSHOT_BUILDS"]:
+            yield self._serving
+            if refresh:
+                self._save_last_update()
+            return
+
+        build = self._start_build(build_name)
+        self._building = build
+        try:
+            yield build
+        except BaseException:
+            self._building = None
+            if keep_failed:
+                logger.info(
+                    f"Keeping snapshot {os.path.basename(build.directory)} to resume"
+                )
+                build.close()
+            else:
+                self._discard_build(build)
+            raise
+        self._building = None
+        if refresh or build.modified:
+            self._publish(build, refresh)
+        else:
+            self._discard_build(build)
+
+    def _start_build(self, name: Optional[str] = None) -> StoreSnapshot:
+        if name:
+            directory = os.path.join(self.persist_directory, "snapshots", name)
+            if os.path.isdir(directory):
+                logger.info(f"Resuming snapshot {name}")
+                return self._open_snapshot(directory)
+        name = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        directory = os.path.join(self.persist_directory, "snapshots", name)
+        # Only the leader writes, so the served store is not changing under
+        # the copy. Its files are read, never modified, by the build.
+        shutil.copytree(
+            self._serving.directory,
+            directory,
+            ignore=lambda _, names: [
+                n for n in names if n in SHARED_FILES or n.endswith(".tmp")
+            ],
+        )
+        logger.info(f"Building snapshot {name}")
+        return self._open_snapshot(directory)
+
+    def _discard_build(self, build: StoreSnapshot):
+        logger.info(f"Discarding snapshot {os.path.basename(build.directory)}")
+        build.close()
+        shutil.rmtree(build.directory, ignore_errors=True)
+
+    def _publish(self, build: StoreSnapshot, refresh: bool):
+        name = os.path.basename(build.directory)
+        # The pointer flips before the generation so no reader ever pairs a
+        # new generation with the previous snapshot's data.
+        _write_atomically(os.path.join(self.persist_directory, "CURRENT"), name)
+        if refresh:
+            self._save_last_update()
+        with self._swap_lock:
+            self._retire(self._serving)
+            self._serving = build
+            self.last_update = self._get_last_update()
+            self._loaded_version = self._version()
+        logger.info(f"Published snapshot {name}")
+        self._prune_snapshots(name)
+
+    def _retire(self, snapshot: StoreSnapshot):
+        if self._retired is not None:
+            self._retired.close()
+        self._retired = snapshot
+
+    def _published_snapshots(self, current: str) -> List[str]:
+        path = os.path.join(self.persist_directory, "PUBLISHED")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return [name for name in f.read().split() if name != current]
+        # Stores from before the list was kept: take what is on disk.
+        snapshots_dir = os.path.join(self.persist_directory, "snapshots")
+        return sorted(n for n in os.listdir(snapshots_dir) if n < current)
+
+    def _prune_snapshots(self, current: str):
+        # Keep a few published predecessors for readers that have not yet
+        # reloaded. They are tracked in PUBLISHED, next to CURRENT, so a
+        # failed build left on disk never takes their place; anything else in
+        # snapshots/ is an abandoned build and goes too.
+        published = self._published_snapshots(current) + [current]
+        keep = published[-max(cfg["SNAPSHOTS_TO_KEEP"], 1) :]
+        _write_atomically(
+            os.path.join(self.persist_directory, "PUBLISHED"),
+            "".join(f"{name}\n" for name in keep),
+        )
+        snapshots_dir = os.path.join(self.persist_directory, "snapshots")
+        for name in os.listdir(snapshots_dir):
+            if name not in keep:
+                shutil.rmtree(os.path.join(snapshots_dir, name), ignore_errors=True)
+
+    def _require_writable(self):
+        if self.read_only:
+            raise RuntimeError(
+                "This NewsDatabase is read-only; run the ingestion worker "
+                "(python database.py --worker) to update it"
+            )
+
+    def _reload_if_new_generation(self):
+        # Another process may have published a new snapshot or refreshed the
+        # store in place. Chroma keeps the HNSW index in memory, so the store
+        # is reopened to see the new data; queries keep using the old handles
+        # until the new ones are swapped in, and the old ones are retired, not
+        # closed, so queries already running on them can finish.
+        version = self._version()
+        if version == self._loaded_version:
+            return
+        with self._swap_lock:
+            if version == self._loaded_version:
+                return  # Another thread reloaded first
+            logger.info(f"Loading new database version {version}")
+            directory = self._current_directory()
+            if directory == self._serving.directory:
+                _detach_vector_store(self._serving.vector_store)
+            previous, self._serving = self._serving, self._open_snapshot(directory)
+            self._retire(previous)
+            self.last_update = self._get_last_update()
+            self._loaded_version = version
+
+    def _get_last_update(self) -> Optional[datetime]:
         if os.path.exists(os.path.join(self.persist_directory, "last_update.txt")):
             with open(
                 os.path.join(self.persist_directory, "last_update.txt"), "r"
             ) as f:
-                return datetime.fromisoformat(f.read().strip())
+                try:
+                    return datetime.fromisoformat(f.read().strip())
+                except ValueError:
+                    return None  # Caught mid-write by the ingestion worker
         return None
 
+    def generation(self) -> str:
+        """Identify the current data generation; changes with every refresh.
+
+        Read from disk so processes that did not run the refresh see it too.
+        """
+        last_update = self._get_last_update()
+        return last_update.isoformat() if last_update else ""
+
     def _save_last_update(self):
-        with open(os.path.join(self.persist_directory, "last_update.txt"), "w") as f:
-            f.write(datetime.now().isoformat())
-
-    def add_articles(self, articles: List[Dict[str, str]]):
-        documents = [
-            Document(
-                page_content=article["content"],
-                metadata={
-                    "source": article["url"],
-                    "topic": article["topic"],
-                    "country": article["country"],
-                },
-            )
-            for article in articles
+        _write_atomically(
+            os.path.join(self.persist_directory, "last_update.txt"),
+            datetime.now().isoformat(),
+        )
+
+    def add_articles(self, articles: List[Dict[str, str]]) -> int:
+        """Embed and store new or changed articles; return how many were written.
+
+        Articles whose normalized URL and content hash are already indexed are
+        skipped before embedding. Each article is stored as chunks with IDs
+        ``<article id>:<n>`` and a ``parent_id`` metadata field; a changed
+        article has its old chunks replaced. Chunk text goes to the compressed
+        article store, and the vector store keeps only its ``text_ref`` and
+        ``length``.
+        """
+        self._require_writable()
+        with self._writing() as store:
+            return self._write_articles(store, articles)
+
+    def _write_articles(
+        self, store: StoreSnapshot, articles: List[Dict[str, str]]
+    ) -> int:
+        changed = store.dedup_index.filter_changed(articles)
+        if not changed:
+            return 0
+        # Syndicated copies are kept as alternate sources, not embedded.
+        canonical = store.dedup_index.find_near_duplicates(changed)
+        if canonical:
+            logger.info(f"  Collapsed {len(canonical)} near-duplicate articles")
+        pending = [entry for entry in changed if entry[0] not in canonical]
+
+        scraped_at = time.time()
+        chunked = [
+            (doc_id, article, self.text_splitter.split_text(article["content"]))
+            for doc_id, _, article in pending
         ]
-        self.vector_store.add_documents(documents)
+        refs = store.article_store.put_many(chunks for _, _, chunks in chunked)
+        ids, texts, metadatas = [], [], []
+        for (doc_id, article, chunks), chunk_refs in zip(chunked, refs):
+            for index, (chunk, ref) in enumerate(zip(chunks, chunk_refs)):
+                ids.append(f"{doc_id}:{index}")
+                texts.append(chunk)
+                metadatas.append(
+                    {
+                        "source": article["url"],
+                        "topic": article["topic"],
+                        "country": article["country"],
+                        "scraped_at": scraped_at,
+                        "parent_id": doc_id,
+                        "chunk": index,
+                        "text_ref": ref,
+                        "length": len(chunk),
+                    }
+                )
+
+        # A changed article may now have fewer chunks, and articles stored
+        # before chunking were indexed whole under the bare article ID.
+        parent_ids = [doc_id for doc_id, _, _ in changed]
+        with _traced_store("delete"):
+            if isinstance(store.vector_store, PartitionedFaissStore):
+                store.vector_store.delete(ids=parent_ids, parent_ids=parent_ids)
+            else:
+                store.vector_store._collection.delete(
+                    where={"parent_id": {"$in": parent_ids}}
+                )
+                legacy_ids = store.vector_store.get(ids=parent_ids, include=[])["ids"]
+                if legacy_ids:
+                    store.vector_store.delete(ids=legacy_ids)
+        store.lexical_index.remove_parents(parent_ids)
+        if ids:
+            # Includes embedding the chunks, traced as child spans.
+            with _traced_store("insert"):
+                trace.get_current_span().set_attribute("newsllm.chunks", len(ids))
+                embeddings = self.embedding_function.embed_documents(texts)
+                if isinstance(store.vector_store, PartitionedFaissStore):
+                    store.vector_store.add_embeddings(embeddings, metadatas, ids)
+                else:
+                    store.vector_store._collection.upsert(
+                        ids=ids, embeddings=embeddings, metadatas=metadatas
+                    )
+            store.lexical_index.add(
+                (
+                    chunk_id,
+                    metadata["parent_id"],
+                    f"{metadata['country']}|{metadata['topic']}",
+                    text,
+                )
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            )
+        store.dedup_index.record(changed, canonical)
+        store.modified = True
+        return len(pending)
+
+    def _retention_days(self, country: str, topic: str) -> Optional[float]:
+        policy = cfg["RETENTION_DAYS"]
+        for key in ((country, topic), topic, country, "default"):
+            if key in policy:
+                return policy[key]
+        return None
+
+    def apply_retention(self) -> int:
+        """Evict articles older than the retention policy and compact the index.
+
+        An article is stale when it was both scraped and last seen in search
+        results before the cutoff for its country/topic. Articles written
+        before timestamps existed have no ``scraped_at`` and are always stale.
+        """
+        self._require_writable()
+        now = time.time()
+        # Stale articles are found on the served store first so a run with
+        # nothing to evict does not build a snapshot.
+        stale, stale_chunks = [], []
+        for country in self.countries:
+            for topic in self.topics:
+                days = self._retention_days(country, topic)
+                if days is None:
+                    continue
+                cutoff = now - days * 86400
+
+                existing = self.vector_store.get(
+                    where={"$and": [{"country": country}, {"topic": topic}]},
+                    include=["metadatas"],
+                )
+                # Chunks of one article share its scrape time and last-seen
+                # entry, so articles are evicted whole.
+                candidates = {}
+                for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+                    if metadata.get("scraped_at", 0) < cutoff:
+                        parent_id = metadata.get("parent_id", chunk_id)
+                        candidates.setdefault(parent_id, []).append(chunk_id)
+                last_seen = self.dedup_index.last_seen(list(candidates))
+                expired = [
+                    doc_id for doc_id in candidates if last_seen.get(doc_id, 0) < cutoff
+                ]
+                if expired:
+                    stale.extend(expired)
+                    stale_chunks.extend(
+                        chunk_id
+                        for doc_id in expired
+                        for chunk_id in candidates[doc_id]
+                    )
+                    logger.info(
+                        f"  Evicting {len(expired)} stale articles for (country | topic: {country} | {topic})"
+                    )
+
+        if stale:
+            with self._writing() as store:
+                store.vector_store.delete(ids=stale_chunks)
+                store.lexical_index.remove(stale_chunks)
+                store.dedup_index.forget(stale)
+                store.modified = True
+                self._compact(store)
+        return len(stale)
+
+    def compact(self, batch_size: int = 1000):
+        """Rebuild the collection so deleted vectors stop bloating the HNSW files.
+
+        Chroma only marks deleted vectors; the segment keeps its size. The live
+        records are copied into a fresh collection, which then replaces the old
+        one, and the SQLite file is vacuumed. Chunks written before the article
+        store have their text moved into it on the way, and text no chunk
+        refers to any more is dropped from it.
+        """
+        self._require_writable()
+        with self._writing() as store:
+            self._compact(store, batch_size)
+
+    def _compact(self, store: StoreSnapshot, batch_size: int = 1000):
+        if isinstance(store.vector_store, PartitionedFaissStore):
+            # Rewrites every partition without its deleted vectors.
+            store.vector_store.vacuum()
+            self._sweep_texts(
+                store, store.vector_store.get(include=["metadatas"])["metadatas"]
+            )
+            store.modified = True
+            return
+        client = store.vector_store._client
+        temp_name = f"{COLLECTION_NAME}_compact"
+        records = store.vector_store.get(
+            include=["embeddings", "metadatas", "documents"]
+        )
+        legacy: Dict[str, List[int]] = {}
+        for i, (chunk_id, metadata) in enumerate(
+            zip(records["ids"], records["metadatas"])
+        ):
+            if "text_ref" not in metadata and records["documents"][i]:
+                legacy.setdefault(metadata.get("parent_id", chunk_id), []).append(i)
+        refs = store.article_store.put_many(
+            [records["documents"][i] for i in rows] for rows in legacy.values()
+        )
+        for rows, row_refs in zip(legacy.values(), refs):
+            for i, ref in zip(rows, row_refs):
+                records["metadatas"][i].update(
+                    text_ref=ref, length=len(records["documents"][i])
+                )
 
+        fresh = client.create_collection(
+            temp_name, metadata=store.vector_store._collection.metadata
+        )
+        for start in range(0, len(records["ids"]), batch_size):
+            end = start + batch_size
+            fresh.add(
+                ids=records["ids"][start:end],
+                embeddings=records["embeddings"][start:end],
+                metadatas=records["metadatas"][start:end],
+            )
+
+        client.delete_collection(COLLECTION_NAME)
+        fresh.modify(name=COLLECTION_NAME)
+        store.vector_store = self._load_or_create_vector_store(store.directory)
+        store.modified = True
+        self._sweep_texts(store, records["metadatas"])
+
+        try:
+            conn = sqlite3.connect(os.path.join(store.directory, "chroma.sqlite3"))
+            conn.execute("VACUUM")
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not vacuum the Chroma database: {e}")
+        logger.info(f"Compacted collection to {len(records['ids'])} documents")
+
+    def _sweep_texts(self, store: StoreSnapshot, metadatas: List[Dict]):
+        dropped = store.article_store.retain(
+            {metadata["text_ref"] for metadata in metadatas if "text_ref" in metadata}
+        )
+        if dropped:
+            logger.info(f"Dropped {dropped} unreferenced texts from the article store")
+
+    def _finish_interrupted_compaction(self, vector_store: Chroma) -> bool:
+        # A crash between dropping the old collection and renaming the new one
+        # leaves an empty live collection next to the complete copy.
+        client = vector_store._client
+        temp_name = f"{COLLECTION_NAME}_compact"
+        names = [getattr(c, "name", c) for c in client.list_collections()]
+        if temp_name not in names:
+            return False
+        if vector_store._collection.count() > 0:
+            client.delete_collection(temp_name)
+            return False
+        client.delete_collection(COLLECTION_NAME)
+        client.get_collection(temp_name).modify(name=COLLECTION_NAME)
+        return True
+
+    @tracer.start_as_current_span("news.search")
     def search(
-        self, query: str, country: str, topic: str, k: int = 10
+        self,
+        query: str,
+        country: str,
+        topic: str,
+        k: int = 10,
+        diverse: bool = False,
+        hydrate: bool = True,
     ) -> List[Document]:
+        """Return the chunks most similar to ``query`` in one country/topic.
+
+        With ``diverse`` the results are re-ranked by maximal marginal
+        relevance, trading a little similarity for chunks that differ from the
+        ones already picked. Each result lists the syndicated copies of its
+        article under ``alternate_sources``. Without ``hydrate`` the chunks
+        come back with empty text and its ``length`` in the metadata, for the
+        caller to pick from and pass the picks to ``hydrate``.
+        """
+        if self.read_only:
+            self._reload_if_new_generation()
+        store = self._serving
         filter_dict = {"$and": [{"country": country}, {"topic": topic}]}
-        return self.vector_store.similarity_search(query, k=k, filter=filter_dict)
+        results = self._dense_search(
+            store,
+            query,
+            k,
+            filter_dict,
+            fetch_k=k * cfg["MMR_FETCH_FACTOR"] if diverse else None,
+        )
+        return self._with_alternates(
+            self._hydrate(store, [doc for doc, _ in results], legacy_only=not hydrate)
+        )
+
+    def hydrate(self, documents: List[Document]) -> List[Document]:
+        """Load the text of chunks returned by a search without ``hydrate``."""
+        return self._hydrate(self._serving, documents)
 
-    def _scrape_topic(self, country: str, topic: str, results: List[Dict[str, str]]):
-        new_articles = self.scraper.scrape_news(country, [topic], urls_per_topic=10)[
-            topic
+    def _hydrate(
+        self, store: StoreSnapshot, documents: List[Document], legacy_only: bool = False
+    ) -> List[Document]:
+        """Fill in the text of ``documents`` that have none, in place.
+
+        Chunks written before the article store keep their text in the vector
+        store and have no ``length``, so they are always filled in, by the ID
+        the vector store returned with them (whole pages written before
+        chunking have random IDs). A text is cut to the chunk's ``length``,
+        which a caller may have lowered to fit a budget. Chunks whose text is
+        gone, evicted since the search, are left out.
+        """
+        missing = [doc for doc in documents if not doc.page_content]
+        refs = [
+            doc.metadata["text_ref"] for doc in missing if "text_ref" in doc.metadata
         ]
-        for article in new_articles:
-            article["topic"] = topic
-            article["country"] = country
-        results.extend(new_articles)
+        texts = {} if legacy_only else store.article_store.get_many(refs)
+        legacy = [doc.id for doc in missing if "text_ref" not in doc.metadata]
+        if legacy:
+            records = store.vector_store.get(ids=legacy, include=["documents"])
+            texts.update(zip(records["ids"], records["documents"]))
+
+        hydrated = []
+        for doc in documents:
+            if not doc.page_content and not (
+                legacy_only and "text_ref" in doc.metadata
+            ):
+                text = texts.get(doc.metadata.get("text_ref") or doc.id)
+                if not text:
+                    continue
+                doc.page_content = text[: doc.metadata.get("length", len(text))]
+            hydrated.append(doc)
+        return hydrated
+
+    def _dense_search(
+        self,
+        store: StoreSnapshot,
+        query: str,
+        k: int,
+        filter_dict: Dict,
+        fetch_k: Optional[int] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Return ``(document, distance)`` pairs, MMR-selected when ``fetch_k`` is set.
+
+        Documents come back without their text; see ``_hydrate``.
+        """
+        with _traced_store("query" if fetch_k is None else "mmr_query"):
+            return self._query_vector_store(
+                store.vector_store, query, k, filter_dict, fetch_k
+            )
+
+    def _query_vector_store(
+        self,
+        vector_store: VectorStore,
+        query: str,
+        k: int,
+        filter_dict: Dict,
+        fetch_k: Optional[int],
+    ) -> List[Tuple[Document, float]]:
+        query_embedding = np.asarray(self.embedding_function.embed_query(query))
+        if isinstance(vector_store, PartitionedFaissStore):
+            if fetch_k is None:
+                return vector_store.similarity_search_by_vector_with_score(
+                    query_embedding.tolist(), k=k, filter=filter_dict
+                )
+            documents = vector_store.max_marginal_relevance_search_by_vector(
+                query_embedding.tolist(),
+                k=k,
+                fetch_k=fetch_k,
+                lambda_mult=cfg["MMR_LAMBDA"],
+                filter=filter_dict,
+            )
+            return [(doc, 0.0) for doc in documents]
+
+        # Queried on the collection rather than through LangChain, so that no
+        # document text is read.
+        try:
+            results = vector_store._collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=fetch_k or k,
+                where=filter_dict,
+                include=["metadatas", "distances"]
+                + (["embeddings"] if fetch_k else []),
+            )
+            ids = results["ids"][0]
+            metadatas, distances = results["metadatas"][0], results["distances"][0]
+            embeddings = results["embeddings"][0] if fetch_k else None
+        except RuntimeError as e:
+            # hnswlib cannot always reach every member of a filtered subset, so
+            # Chroma raises when a request covers a whole small country/topic
+            # partition. The partition is then the candidate set anyway, and it
+            # is ranked exactly instead. Any other error is a real failure.
+            if HNSW_UNREACHABLE_ERROR not in str(e):
+                raise
+            logger.warning(
+                f"Vector index could not return {fetch_k or k} results for "
+                f"{filter_dict}; ranking the partition exactly"
+            )
+            trace.get_current_span().set_attribute("newsllm.exact_fallback", True)
+            records = vector_store.get(
+                where=filter_dict, include=["metadatas", "embeddings"]
+            )
+            ids, metadatas = records["ids"], records["metadatas"]
+            embeddings = records["embeddings"]
+            distances = ((np.asarray(embeddings) - query_embedding) ** 2).sum(axis=1)
+        if not metadatas:
+            return []
+        if fetch_k is None:
+            order = np.argsort(distances)[:k]
+        else:
+            order = maximal_marginal_relevance(
+                query_embedding,
+                list(np.asarray(embeddings)),
+                k=min(k, len(embeddings)),
+                lambda_mult=cfg["MMR_LAMBDA"],
+            )
+        return [
+            (
+                Document(id=ids[i], page_content="", metadata=metadatas[i]),
+                float(distances[i]),
+            )
+            for i in order
+        ]
+
+    def _with_alternates(self, documents: List[Document]) -> List[Document]:
+        alternates = self.dedup_index.alternates(
+            list({doc.metadata.get("parent_id", "") for doc in documents})
+        )
+        for doc in documents:
+            doc.metadata["alternate_sources"] = alternates.get(
+                doc.metadata.get("parent_id"), []
+            )
+        return documents
+
+    @tracer.start_as_current_span("news.hybrid_search")
+    def hybrid_search(
+        self,
+        query: str,
+        country: str,
+        topic: str,
+        k: int = 10,
+        alpha: Optional[float] = None,
+        hydrate: bool = True,
+    ) -> List[Document]:
+        """Rank chunks by a weighted sum of vector similarity and BM25 score.
+
+        Each score is min-max normalized over its own candidates, so ``alpha``
+        (default ``HYBRID_ALPHA``) sets the balance: 1.0 is purely dense, 0.0
+        purely lexical. Chunks found only by BM25 are fetched by ID. Only the
+        top ``k`` are hydrated, and not at all without ``hydrate`` (see
+        ``search``).
+        """
+        if self.read_only:
+            self._reload_if_new_generation()
+        alpha = cfg["HYBRID_ALPHA"] if alpha is None else alpha
+        fetch_k = k * cfg["HYBRID_FETCH_FACTOR"]
+        store = self._serving  # One snapshot for both indexes
+        filter_dict = {"$and": [{"country": country}, {"topic": topic}]}
+
+        documents: Dict[str, Document] = {}
+        dense: Dict[str, float] = {}
+        # Keyed on the IDs the vector store returns, which the lexical index
+        # shares, so both scores of a chunk combine.
+        for doc, distance in self._dense_search(store, query, fetch_k, filter_dict):
+            documents[doc.id] = doc
+            dense[doc.id] = -distance
+        with timed_span(
+            "lexical_index.query",
+            VECTOR_STORE_DURATION,
+            **{"db.system": "bm25", "db.operation": "query"},
+        ):
+            lexical = dict(
+                store.lexical_index.search(query, f"{country}|{topic}", fetch_k)
+            )
+
+        missing = [chunk_id for chunk_id in lexical if chunk_id not in documents]
+        if missing:
+            records = store.vector_store.get(ids=missing, include=["metadatas"])
+            for chunk_id, metadata in zip(records["ids"], records["metadatas"]):
+                documents[chunk_id] = Document(
+                    id=chunk_id, page_content="", metadata=metadata
+                )
+
+        def normalized(scores: Dict[str, float]) -> Dict[str, float]:
+            if not scores:
+                return {}
+            low, high = min(scores.values()), max(scores.values())
+            return {
+                key: (value - low) / (high - low) if high > low else 1.0
+                for key, value in scores.items()
+            }
+
+        dense, lexical = normalized(dense), normalized(lexical)
+        ranked = sorted(
+            documents,
+            key=lambda chunk_id: alpha * dense.get(chunk_id, 0.0)
+            + (1 - alpha) * lexical.get(chunk_id, 0.0),
+            reverse=True,
+        )
+        return self._with_alternates(
+            self._hydrate(
+                store,
+                [documents[chunk_id] for chunk_id in ranked[:k]],
+                legacy_only=not hydrate,
+            )
+        )
+
+    def _backfill_lexical_index(self, store: StoreSnapshot):
+        # Stores written before the lexical index existed get it built once.
+        if not store.lexical_index.is_empty():
+            return
+        records = store.vector_store.get(include=["documents", "metadatas"])
+        if not records["ids"]:
+            return
+        logger.info(f"Building the lexical index for {len(records['ids'])} chunks...")
+        texts = store.article_store.get_many(
+            [
+                metadata["text_ref"]
+                for metadata in records["metadatas"]
+                if "text_ref" in metadata
+            ]
+        )
+        store.lexical_index.add(
+            (
+                chunk_id,
+                metadata.get("parent_id", chunk_id),
+                f"{metadata['country']}|{metadata['topic']}",
+                text or texts.get(metadata.get("text_ref"), ""),
+            )
+            for chunk_id, text, metadata in zip(
+                records["ids"], records["documents"], records["metadatas"]
+            )
+        )
+        store.modified = True
+
+    def _collect_articles(
+        self,
+        country: str,
+        topic: str,
+        new_articles: List[Dict[str, str]],
+        sink: Queue,
+    ):
         logger.info(
             f"  Found {len(new_articles)} new articles for (country | topic: {country} | {topic})"
         )
+        for article in new_articles:
+            article["topic"] = topic
+            article["country"] = country
+        # Checkpoint before queueing so a crash never loses a finished scrape.
+        self._journal.save_job(country, topic, new_articles)
+        for article in new_articles:
+            sink.put(article)  # Blocks while the ingest queue is full
 
-    def update_database(self):
-        logger.info("Starting database update...")
-        all_new_articles = []
-        threads = []
+    def _pending_jobs(self, sink: Queue) -> List[tuple]:
+        """Replay journaled scrape jobs into ``sink``; return those still to run.
 
+        Articles already written to the store by an interrupted run are skipped.
+        """
+        ingested = self._journal.ingested()
+        jobs = []
+        resumed = 0
         for country in self.countries:
-            logger.info(f"Scraping news for country: {country}")
             for topic in self.topics:
-                logger.info(f"  Scraping topic: {topic}")
-                thread = threading.Thread(
-                    target=self._scrape_topic, args=(country, topic, all_new_articles)
+                if not self._journal.has_job(country, topic):
+                    jobs.append((country, topic))
+                    continue
+                resumed += 1
+                for article in self._journal.load_job(country, topic):
+                    if article_id(article["url"], country, topic) not in ingested:
+                        sink.put(article)
+        if resumed:
+            logger.info(
+                f"Resuming refresh: {resumed} scrape jobs restored from the journal, "
+                f"{len(jobs)} left to run"
+            )
+        return jobs
+
+    def _scrape_topic(self, country: str, topic: str, sink: Queue):
+        new_articles = self.scraper.scrape_news(
+            country, [topic], urls_per_topic=cfg["URLS_PER_TOPIC"]
+        )[topic]
+        self._collect_articles(country, topic, new_articles, sink)
+
+    async def _scrape_all_async(self, jobs: List[tuple], sink: Queue):
+        async for country, topic, new_articles in self.scraper.scrape_jobs(
+            jobs, urls_per_topic=cfg["URLS_PER_TOPIC"]
+        ):
+            # Hand off without blocking the event loop when the queue is full.
+            await asyncio.to_thread(
+                self._collect_articles, country, topic, new_articles, sink
+            )
+
+    def _scrape_all_pooled(self, jobs: List[tuple], sink: Queue):
+        with ThreadPoolExecutor(
+            max_workers=cfg["SCRAPE_WORKERS"], thread_name_prefix="scrape"
+        ) as pool:
+            futures = []
+            for country, topic in jobs:
+                logger.info(f"  Scraping (country | topic: {country} | {topic})")
+                futures.append(
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        self._scrape_topic,
+                        country,
+                        topic,
+                        sink,
+                    )
                 )
-                threads.append(thread)
-                thread.start()
 
-        for thread in threads:
-            thread.join()
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception("Scraping job failed")
+
+    def _ingest_worker(self, source: Queue, stats: Dict[str, int]):
+        """Embed and write articles in bounded batches as they arrive.
+
+        Runs until it receives ``None``. A batch is flushed when it is full or
+        when no new article arrived within ``INGEST_FLUSH_SECONDS``.
+        """
+        batch = []
+        done = False
+        while not done:
+            try:
+                article = source.get(timeout=cfg["INGEST_FLUSH_SECONDS"])
+            except Empty:
+                article = False
+
+            if article is None:
+                done = True
+            elif article:
+                batch.append(article)
+
+            if batch and (
+                done or not article or len(batch) >= cfg["INGEST_BATCH_SIZE"]
+            ):
+                logger.info(f"Ingesting a batch of {len(batch)} scraped articles...")
+                try:
+                    with tracer.start_as_current_span(
+                        "news.ingest_batch", attributes={"newsllm.articles": len(batch)}
+                    ):
+                        written = self.add_articles(batch)
+                    self._journal.mark_ingested(
+                        article_id(a["url"], a["country"], a["topic"]) for a in batch
+                    )
+                    stats["added"] += written
+                    stats["unchanged"] += len(batch) - written
+                except Exception:
+                    # Keep draining the queue so producers never block forever.
+                    logger.exception(f"Failed to add a batch of {len(batch)} articles")
+                    stats["failed"] += len(batch)
+                batch = []
+
+    @tracer.start_as_current_span("news.refresh")
+    def update_database(self):
+        self._require_writable()
+        logger.info("Starting database update...")
+        stats = {"added": 0, "unchanged": 0, "failed": 0}
+        journal = RefreshJournal(
+            os.path.join(self.persist_directory, "refresh"),
+            max_age_seconds=cfg["REFRESH_JOURNAL_MAX_AGE_HOURS"] * 3600,
+        )
+        # An unpublished build is only resumed on top of the store it was
+        # copied from; otherwise the scraped results are replayed into a new one.
+        base = self._serving.directory
+        with self._writing(
+            refresh=True,
+            build_name=journal.build if journal.base == base else None,
+            keep_failed=True,
+        ) as store:
+            journal.bind(
+                base,
+                (
+                    os.path.basename(store.directory)
+                    if store is not self._serving
+                    else None
+                ),
+            )
+            self._journal = journal
+            self._backfill_lexical_index(store)
+            articles = Queue(maxsize=cfg["INGEST_QUEUE_SIZE"])
+            # The copied context parents the consumer's spans to this refresh.
+            consumer = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._ingest_worker, articles, stats),
+                name="ingest",
+            )
+            consumer.start()
+
+            self.scraper.open_extraction_pool()
+            try:
+                jobs = self._pending_jobs(articles)
+                if cfg["ASYNC_SCRAPING"]:
+                    asyncio.run(self._scrape_all_async(jobs, articles))
+                else:
+                    self._scrape_all_pooled(jobs, articles)
+            finally:
+                self.scraper.close_extraction_pool()
+                articles.put(None)
+                consumer.join()
+                self._journal = None
 
-        logger.info(f"Adding {len(all_new_articles)} new articles to the database...")
-        self.add_articles(all_new_articles)
-        self._save_last_update()
-        self.last_update = datetime.now()
+            logger.info(
+                f"Added {stats['added']} new or changed articles to the database "
+                f"({stats['unchanged']} unchanged, {stats['failed']} failed)"
+            )
+            if stats["failed"] and not stats["added"] + stats["unchanged"]:
+                # Nothing could be written; keep serving the previous data.
+                raise RuntimeError("Every ingest batch failed; refresh abandoned")
+        journal.clear()
+        self.last_update = self._get_last_update()
         logger.info(f"Database updated at {self.last_update}")
 
+        if cfg["PREWARM_ANALYSIS"] and self.analysis_llm is not None:
+            prewarm_analyses(self, self.analysis_llm, self.analysis_cache)
+
     def start_automatic_updates(self):
-        def update_job():
-            self.update_database()
+        """Start the refresh and retention scheduler.
+
+        At most one scheduler runs per process, however many times this is
+        called; it is stopped on interpreter exit.
+        """
+        self._require_writable()
+        with NewsDatabase._scheduler_lock:
+            if NewsDatabase._scheduler_thread is not None:
+                return
+
+            def run_safely(job):
+                def wrapper():
+                    if not self.leader_lock.acquire():
+                        logger.info(f"Skipping {job.__name__}: not the ingest leader")
+                        return
+                    try:
+                        job()
+                    except Exception:
+                        logger.exception(f"Scheduled job {job.__name__} failed")
+
+                return wrapper
+
+            scheduler = schedule.Scheduler()
+            scheduler.every(cfg["UPDATE_INTERVAL_HOURS"]).hours.do(
+                run_safely(self.update_database)
+            )
+            scheduler.every(cfg["RETENTION_INTERVAL_HOURS"]).hours.do(
+                run_safely(self.apply_retention)
+            )
+            stop = threading.Event()
+
+            def run_schedule():
+                while not stop.is_set():
+                    scheduler.run_pending()
+                    stop.wait(1)
+
+            thread = threading.Thread(
+                target=run_schedule, name="news-scheduler", daemon=True
+            )
+            NewsDatabase._scheduler_thread = thread
+            NewsDatabase._scheduler_stop = stop
+            thread.start()
+            atexit.register(NewsDatabase.stop_automatic_updates)
+            logger.info("Automatic updates scheduled")
+
+    def run_due_jobs(self):
+        """Run the refresh and retention jobs whose interval has elapsed.
+
+        Due times come from the persisted last update, so a worker that takes
+        over leadership does not redo a refresh another worker just finished.
+        A failed job is logged and does not keep the other from running; a
+        failed refresh leaves the last update as it was and is retried on the
+        next poll.
+        """
+        now = datetime.now()
+        last_update = self._get_last_update()
+        if last_update is None or now - last_update >= timedelta(
+            hours=cfg["UPDATE_INTERVAL_HOURS"]
+        ):
+            try:
+                self.update_database()
+            except Exception:
+                logger.exception("Scheduled job update_database failed")
+        if self._last_retention is None or now - self._last_retention >= timedelta(
+            hours=cfg["RETENTION_INTERVAL_HOURS"]
+        ):
+            try:
+                self.apply_retention()
+            except Exception:
+                logger.exception("Scheduled job apply_retention failed")
+            self._last_retention = now
+
+    @staticmethod
+    def stop_automatic_updates(timeout: float = 10.0):
+        with NewsDatabase._scheduler_lock:
+            thread = NewsDatabase._scheduler_thread
+            if thread is None:
+                return
+            NewsDatabase._scheduler_stop.set()
+            thread.join(timeout)
+            NewsDatabase._scheduler_thread = None
+            atexit.unregister(NewsDatabase.stop_automatic_updates)
+            logger.info("Automatic updates stopped")
+
+
+def run_worker(persist_directory: str = "./chroma_db"):
+    """Run the standalone ingestion worker.
 
-        schedule.every(24).hours.do(update_job)
+    Any number of workers (and app replicas) may share one persist directory.
+    Workers elect a leader through ``LeaderLock``; only the leader scrapes,
+    embeds and writes, and standby workers take over if it dies. App processes
+    open the store with ``read_only=True`` and pick up each new generation.
+    """
+    load_dotenv()
+    setup_telemetry()
+    leader_lock = LeaderLock(os.path.join(persist_directory, "ingest.lock"))
+    while not leader_lock.acquire():
+        logger.info("Another worker is the ingest leader; waiting on standby...")
+        time.sleep(cfg["WORKER_POLL_SECONDS"])
+    logger.info(f"Process {os.getpid()} is now the ingest leader")
 
-        def run_schedule():
-            while True:
-                schedule.run_pending()
-                time.sleep(1)
+    analysis_llm = None
+    if cfg["PREWARM_ANALYSIS"] and os.getenv("GOOGLE_API_KEY"):
+        analysis_llm = create_llm()
+    db = NewsDatabase(persist_directory, analysis_llm=analysis_llm)
+    # flock is per open file, so the database must reuse the held lock rather
+    # than open a second one that would conflict with it.
+    db.leader_lock = leader_lock
 
-        thread = threading.Thread(target=run_schedule)
-        thread.start()
+    while True:
+        try:
+            db.run_due_jobs()
+        except Exception:
+            logger.exception("Ingest worker cycle failed")
+        time.sleep(cfg["WORKER_POLL_SECONDS"])
 
 
 if __name__ == "__main__":
-    # Test the database
-    db = NewsDatabase()
+    parser = argparse.ArgumentParser(description="NewsLLM database ingestion")
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="run as a long-lived, leader-elected ingestion worker",
+    )
+    args = parser.parse_args()
 
-    # Initial update
-    db.update_database()
+    if args.worker:
+        run_worker()
+    else:
+        # One-off update
+        load_dotenv()
+        setup_telemetry()
+        db = NewsDatabase()
+        db.update_database()
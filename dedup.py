@@ -0,0 +1,361 @@
+# dedup.py
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+# Query parameters that only track the visitor and never change the page.
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref"}
+
+# MinHash over word 5-shingles. LSH with 16 bands of 4 rows makes two texts
+# candidates from a Jaccard similarity of about 0.5; candidates are confirmed
+# at NEAR_DUPLICATE_THRESHOLD, which syndicated copies of a story clear easily.
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# a, b < 2**31 and 32-bit shingle hashes keep a * h + b below 2**64.
+_rng = np.random.RandomState(20240801)
+_PERM_A = _rng.randint(1, 1 << 31, NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, NUM_PERM).astype(np.uint64)
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    netloc = parts.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    netloc = netloc.removesuffix(":80").removesuffix(":443")
+
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+        )
+    )
+    path = parts.path.rstrip("/") or "/"
+    # Scheme and fragment are dropped: http/https and #anchors are the same page.
+    return urlunsplit(("", netloc, path, query, ""))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def article_id(url: str, country: str, topic: str) -> str:
+    # The same page may legitimately be filed under several country/topic pairs,
+    # so the partition is part of the stable ID.
+    key = f"{country}|{topic}|{normalize_url(url)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def minhash(text: str) -> np.ndarray:
+    """Return the MinHash signature of ``text`` as NUM_PERM uint32 values."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))
+    }
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % (
+        _MERSENNE_PRIME
+    )
+    return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def similarity(signature: np.ndarray, other: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(signature == other))
+
+
+def _bands(signature: np.ndarray) -> List[int]:
+    rows = NUM_PERM // LSH_BANDS
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                signature[band * rows : (band + 1) * rows].tobytes(), digest_size=8
+            ).digest(),
+            "big",
+            signed=True,
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+
+def _partition(article: Dict[str, str]) -> str:
+    return f"{article['country']}|{article['topic']}"
+
+
+class DedupIndex:
+    """Persistent index of what has already been embedded.
+
+    Maps the stable article ID (normalized URL plus country/topic) to the hash
+    of the content stored under it, so unchanged articles can be skipped before
+    they reach the embedding model.
+
+    Stored articles also get a MinHash signature in an LSH table, so that
+    syndicated copies within a country/topic are recorded as alternate sources
+    of the first (canonical) copy instead of being embedded again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS articles (
+                    doc_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    last_seen REAL NOT NULL
+                )
+                """
+            )
+            columns = [
+                row[1] for row in self._conn.execute("PRAGMA table_info(articles)")
+            ]
+            if "canonical_id" not in columns:
+                self._conn.execute("ALTER TABLE articles ADD COLUMN canonical_id TEXT")
+                self._conn.execute("ALTER TABLE articles ADD COLUMN source TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS articles_canonical ON articles (canonical_id)"
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS signatures (
+                    doc_id TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    partition TEXT NOT NULL,
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    doc_id TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS lsh_lookup "
+                "ON lsh_buckets (partition, band, bucket)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS lsh_doc ON lsh_buckets (doc_id)"
+            )
+
+    def filter_changed(
+        self, articles: Iterable[Dict[str, str]]
+    ) -> List[Tuple[str, str, Dict[str, str]]]:
+        """Return ``(doc_id, content_hash, article)`` for new or changed articles.
+
+        Duplicates within ``articles`` collapse to the last occurrence. Unchanged
+        articles are not returned, but their last-seen time is refreshed so
+        retention keeps pages the search results still point at.
+        """
+        pending = {}
+        for article in articles:
+            doc_id = article_id(article["url"], article["country"], article["topic"])
+            pending[doc_id] = (doc_id, content_hash(article["content"]), article)
+
+        if not pending:
+            return []
+
+        doc_ids = list(pending)
+        with self._lock, self._conn:
+            known = {}
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start : start + 500]
+                known.update(
+                    self._conn.execute(
+                        f"SELECT doc_id, content_hash FROM articles WHERE doc_id IN "
+                        f"({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+            unchanged = [
+                doc_id
+                for doc_id, entry in pending.items()
+                if known.get(doc_id) == entry[1]
+            ]
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE articles SET last_seen = ? WHERE doc_id = ?",
+                [(now, doc_id) for doc_id in unchanged],
+            )
+            # A syndicated copy still in the results keeps its canonical alive.
+            self._conn.executemany(
+                "UPDATE articles SET last_seen = ? WHERE doc_id = "
+                "(SELECT canonical_id FROM articles WHERE doc_id = ?)",
+                [(now, doc_id) for doc_id in unchanged],
+            )
+        return [
+            entry for doc_id, entry in pending.items() if known.get(doc_id) != entry[1]
+        ]
+
+    def find_near_duplicates(
+        self, entries: List[Tuple[str, str, Dict[str, str]]]
+    ) -> Dict[str, str]:
+        """Map each entry that copies an already indexed article to that article.
+
+        Earlier entries of the same batch count as indexed, so a story arriving
+        from several sites at once is embedded only once.
+        """
+        duplicates = {}
+        batch: List[Tuple[str, str, np.ndarray, List[int]]] = []
+        for doc_id, _, article in entries:
+            signature = minhash(article["content"])
+            bands = _bands(signature)
+            partition = _partition(article)
+            candidates = {
+                other_id: other_signature
+                for other_id, other_partition, other_signature, other_bands in batch
+                if other_partition == partition
+                and any(a == b for a, b in zip(bands, other_bands))
+            }
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT DISTINCT s.doc_id, s.signature FROM lsh_buckets b "
+                    "JOIN signatures s ON s.doc_id = b.doc_id "
+                    "WHERE b.partition = ? AND ("
+                    + " OR ".join(["(b.band = ? AND b.bucket = ?)"] * LSH_BANDS)
+                    + ")",
+                    [partition]
+                    + [value for pair in enumerate(bands) for value in pair],
+                ).fetchall()
+            for other_id, blob in rows:
+                candidates.setdefault(other_id, np.frombuffer(blob, dtype=np.uint32))
+            candidates.pop(doc_id, None)
+
+            best = max(
+                candidates,
+                key=lambda other_id: similarity(signature, candidates[other_id]),
+                default=None,
+            )
+            if (
+                best is not None
+                and similarity(signature, candidates[best]) >= NEAR_DUPLICATE_THRESHOLD
+            ):
+                duplicates[doc_id] = best
+            else:
+                batch.append((doc_id, partition, signature, bands))
+        return duplicates
+
+    def record(
+        self,
+        entries: Iterable[Tuple[str, str, Dict[str, str]]],
+        canonical: Optional[Dict[str, str]] = None,
+    ):
+        """Record written articles, and duplicates under their ``canonical`` copy."""
+        canonical = canonical or {}
+        entries = list(entries)
+        indexed = [entry for entry in entries if entry[0] not in canonical]
+        signatures = [
+            (doc_id, _partition(article), minhash(article["content"]))
+            for doc_id, _, article in indexed
+        ]
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO articles "
+                "(doc_id, url, content_hash, last_seen, canonical_id, source) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        doc_id,
+                        normalize_url(article["url"]),
+                        digest,
+                        now,
+                        canonical.get(doc_id),
+                        article["url"],
+                    )
+                    for doc_id, digest, article in entries
+                ],
+            )
+            # An article that became a copy hands its own copies over.
+            self._conn.executemany(
+                "UPDATE articles SET canonical_id = ? WHERE canonical_id = ?",
+                [(target, doc_id) for doc_id, target in canonical.items()],
+            )
+            self._forget_signatures([doc_id for doc_id, _, _ in entries])
+            self._conn.executemany(
+                "INSERT INTO signatures VALUES (?, ?)",
+                [(doc_id, signature.tobytes()) for doc_id, _, signature in signatures],
+            )
+            self._conn.executemany(
+                "INSERT INTO lsh_buckets VALUES (?, ?, ?, ?)",
+                [
+                    (partition, band, bucket, doc_id)
+                    for doc_id, partition, signature in signatures
+                    for band, bucket in enumerate(_bands(signature))
+                ],
+            )
+
+    def _forget_signatures(self, doc_ids: List[str]):
+        # Caller holds the lock and an open transaction.
+        self._conn.executemany(
+            "DELETE FROM signatures WHERE doc_id = ?", [(i,) for i in doc_ids]
+        )
+        self._conn.executemany(
+            "DELETE FROM lsh_buckets WHERE doc_id = ?", [(i,) for i in doc_ids]
+        )
+
+    def alternates(self, doc_ids: List[str]) -> Dict[str, List[str]]:
+        """Return the source URLs of the syndicated copies of each article."""
+        found: Dict[str, List[str]] = {}
+        with self._lock:
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start : start + 500]
+                for canonical_id, url in self._conn.execute(
+                    f"SELECT canonical_id, source FROM articles WHERE canonical_id IN "
+                    f"({','.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    found.setdefault(canonical_id, []).append(url)
+        return found
+
+    def last_seen(self, doc_ids: List[str]) -> Dict[str, float]:
+        seen = {}
+        with self._lock:
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start : start + 500]
+                seen.update(
+                    self._conn.execute(
+                        f"SELECT doc_id, last_seen FROM articles WHERE doc_id IN "
+                        f"({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+        return seen
+
+    def forget(self, doc_ids: Iterable[str]):
+        """Drop articles along with the copies recorded under them."""
+        doc_ids = list(doc_ids)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM articles WHERE doc_id = ? OR canonical_id = ?",
+                [(i, i) for i in doc_ids],
+            )
+            self._forget_signatures(doc_ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
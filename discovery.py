@@ -0,0 +1,255 @@
+# discovery.py
+
+import abc
+import asyncio
+import json
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import aiohttp
+import requests
+from googlesearch import search
+
+ATOM_NAMESPACE = "{http://www.w3.org/2005/Atom}"
+FEED_TIMEOUT_SECONDS = 10
+
+
+class DiscoveryBackend(abc.ABC):
+    """Source of candidate article URLs for one country/topic.
+
+    ``discover`` may block. ``discover_async`` runs it in a thread unless a
+    backend has a native async implementation, which then shares the
+    scraper's pooled HTTP client.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def discover(self, country: str, topic: str, num_results: int) -> List[str]:
+        """Return up to ``num_results`` article URLs for ``country`` and ``topic``."""
+
+    async def discover_async(
+        self,
+        country: str,
+        topic: str,
+        num_results: int,
+        client: Optional[aiohttp.ClientSession] = None,
+    ) -> List[str]:
+        return await asyncio.to_thread(self.discover, country, topic, num_results)
+
+
+class GoogleSearchDiscovery(DiscoveryBackend):
+    """Google web search through ``googlesearch``.
+
+    Blocking and rate limited by Google itself, so at most
+    ``max_concurrency`` searches run at once, whichever thread issues them.
+    """
+
+    name = "google"
+
+    def __init__(self, max_concurrency: int = 2, pause: float = 2.0):
+        self.pause = pause
+        self._slots = threading.Semaphore(max_concurrency)
+
+    def discover(self, country: str, topic: str, num_results: int) -> List[str]:
+        query = f"{country} {topic} news"
+        if country.lower() == "international":
+            query = f"international {topic} news"
+        with self._slots:
+            return list(
+                search(query, num=num_results, stop=num_results, pause=self.pause)
+            )
+
+
+def parse_feed(document: bytes) -> List[str]:
+    """Return the item links of an RSS 2.0 or Atom document, in feed order."""
+    root = ElementTree.fromstring(document)
+    links = []
+    for item in root.iter("item"):
+        link = item.findtext("link")
+        if link and link.strip():
+            links.append(link.strip())
+    for entry in root.iter(f"{ATOM_NAMESPACE}entry"):
+        for link in entry.iter(f"{ATOM_NAMESPACE}link"):
+            if link.get("rel", "alternate") == "alternate" and link.get("href"):
+                links.append(link.get("href").strip())
+                break
+    return links
+
+
+def _interleave(feeds: Iterable[List[str]], limit: int) -> List[str]:
+    # Round-robin across feeds so one busy feed does not crowd out the rest.
+    urls: Dict[str, None] = {}
+    queues = [list(links) for links in feeds]
+    while queues and len(urls) < limit:
+        for links in queues:
+            if links:
+                urls.setdefault(links.pop(0))
+        queues = [links for links in queues if links]
+    return list(urls)[:limit]
+
+
+class FeedDiscovery(DiscoveryBackend):
+    """Latest items of RSS/Atom feeds listed per country and topic.
+
+    Keys of ``feeds`` may be a (country, topic) tuple, a topic, a country or
+    "default"; the most specific match wins. All feeds of a query are fetched
+    at once. Pairs with no feeds are passed to ``fallback``, if any.
+    """
+
+    name = "feeds"
+
+    def __init__(
+        self,
+        feeds: Dict[Union[str, Tuple[str, str]], List[str]],
+        fallback: Optional[DiscoveryBackend] = None,
+    ):
+        self.feeds = feeds
+        self.fallback = fallback
+        self.session = requests.Session()
+
+    def feeds_for(self, country: str, topic: str) -> List[str]:
+        for key in ((country, topic), topic, country, "default"):
+            if key in self.feeds:
+                return self.feeds[key]
+        return []
+
+    def _fetch(self, feed: str) -> List[str]:
+        try:
+            response = self.session.get(feed, timeout=FEED_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            return parse_feed(response.content)
+        except (requests.exceptions.RequestException, ElementTree.ParseError) as e:
+            print(f"Error reading feed {feed}: {str(e)}")
+            return []
+
+    async def _fetch_async(self, client: aiohttp.ClientSession, feed: str) -> List[str]:
+        try:
+            async with client.get(
+                feed, timeout=aiohttp.ClientTimeout(total=FEED_TIMEOUT_SECONDS)
+            ) as response:
+                response.raise_for_status()
+                return parse_feed(await response.read())
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            ElementTree.ParseError,
+        ) as e:
+            print(f"Error reading feed {feed}: {str(e) or type(e).__name__}")
+            return []
+
+    def discover(self, country: str, topic: str, num_results: int) -> List[str]:
+        feeds = self.feeds_for(country, topic)
+        if not feeds:
+            if self.fallback is None:
+                return []
+            return self.fallback.discover(country, topic, num_results)
+        with ThreadPoolExecutor(max_workers=len(feeds)) as pool:
+            return _interleave(pool.map(self._fetch, feeds), num_results)
+
+    async def discover_async(
+        self,
+        country: str,
+        topic: str,
+        num_results: int,
+        client: Optional[aiohttp.ClientSession] = None,
+    ) -> List[str]:
+        feeds = self.feeds_for(country, topic)
+        if not feeds:
+            if self.fallback is None:
+                return []
+            return await self.fallback.discover_async(
+                country, topic, num_results, client
+            )
+        if client is None:
+            return await super().discover_async(country, topic, num_results)
+        results = await asyncio.gather(
+            *(self._fetch_async(client, feed) for feed in feeds)
+        )
+        return _interleave(results, num_results)
+
+
+class FixtureDiscovery(DiscoveryBackend):
+    """Fixed URLs per country and topic, for offline runs and benchmarks.
+
+    ``fixture`` maps ``"country|topic"`` to a list of URLs, or is the path of
+    a JSON file holding such a mapping.
+    """
+
+    name = "fixture"
+
+    def __init__(self, fixture: Union[str, Dict[str, List[str]]]):
+        if isinstance(fixture, str):
+            with open(fixture, "r") as f:
+                fixture = json.load(f)
+        self.fixture = fixture
+
+    def discover(self, country: str, topic: str, num_results: int) -> List[str]:
+        return list(self.fixture.get(f"{country}|{topic}", []))[:num_results]
+
+    async def discover_async(
+        self,
+        country: str,
+        topic: str,
+        num_results: int,
+        client: Optional[aiohttp.ClientSession] = None,
+    ) -> List[str]:
+        return self.discover(country, topic, num_results)
+
+
+class CachedDiscovery(DiscoveryBackend):
+    """Reuse another backend's results for the same query for ``ttl`` seconds.
+
+    A refresh that is retried or resumed shortly after a failure does not
+    search again.
+    """
+
+    def __init__(self, backend: DiscoveryBackend, ttl: float):
+        self.backend = backend
+        self.name = backend.name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple[str, str, int], Tuple[float, List[str]]] = {}
+
+    def _get(self, key: Tuple[str, str, int]) -> Optional[List[str]]:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._results[key]
+                return None
+            return list(entry[1])
+
+    def _put(self, key: Tuple[str, str, int], urls: List[str]):
+        # Empty results are usually a transient failure; do not pin them.
+        if urls:
+            with self._lock:
+                self._results[key] = (time.monotonic() + self.ttl, list(urls))
+
+    def discover(self, country: str, topic: str, num_results: int) -> List[str]:
+        key = (country, topic, num_results)
+        urls = self._get(key)
+        if urls is None:
+            urls = self.backend.discover(country, topic, num_results)
+            self._put(key, urls)
+        return urls
+
+    async def discover_async(
+        self,
+        country: str,
+        topic: str,
+        num_results: int,
+        client: Optional[aiohttp.ClientSession] = None,
+    ) -> List[str]:
+        key = (country, topic, num_results)
+        urls = self._get(key)
+        if urls is None:
+            urls = await self.backend.discover_async(
+                country, topic, num_results, client
+            )
+            self._put(key, urls)
+        return urls
@@ -0,0 +1,457 @@
+# embeddings.py
+
+import argparse
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from opentelemetry import trace
+from telemetry import EMBEDDING_BATCH_SIZE, EMBEDDING_DURATION, timed_span
+
+# "torch" runs the sentence-transformers model as is, "int8" quantizes its
+# linear layers when loading it, and "onnx" runs a model exported with
+# ``export_onnx`` on onnxruntime, without loading torch at all.
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+BATCH_SIZE_CANDIDATES = (8, 16, 32, 64, 128)
+# Input length of all-MiniLM-L6-v2; longer text is truncated.
+MAX_SEQUENCE_LENGTH = 256
+
+
+class EmbeddingStore:
+    """Size-bounded on-disk vector cache.
+
+    Vectors live in a fixed-size memory-mapped float32 matrix and a small
+    SQLite table maps each key to its row. When every row is taken, the least
+    recently used tenth of the cache is evicted in one go.
+
+    Several processes (the ingest worker and app replicas) may share one
+    directory: an advisory file lock, shared for reads and exclusive for
+    writes, keeps two of them from claiming the same row, and a vector file
+    that another process replaced is mapped again before it is used.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 50_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_entries = max_entries
+        self._path = os.path.join(directory, "vectors.f32")
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(directory, "cache.lock"), "a+")
+        self._vectors: Optional[np.memmap] = None
+        self._inode: Optional[int] = None
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite3"), check_same_thread=False
+        )
+        with self._locked(exclusive=True), self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _size(self, dim: int) -> int:
+        return self.max_entries * dim * np.dtype(np.float32).itemsize
+
+    def _current(self) -> bool:
+        # Caller holds the file lock. Maps the vector file if it exists and
+        # fits this cache, picking up one another process created or replaced.
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            stat = None
+        if self._vectors is not None and stat is not None:
+            if stat.st_ino == self._inode:
+                return True
+        self._vectors = None
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if stat is None or row is None or stat.st_size != self._size(row[0]):
+            return False
+        self._vectors = np.memmap(
+            self._path, dtype=np.float32, mode="r+", shape=(self.max_entries, row[0])
+        )
+        self._inode = stat.st_ino
+        return True
+
+    def _open(self, dim: int):
+        # Caller holds the file lock exclusively. A file of the wrong size
+        # (capacity or model dimension changed) is replaced, not deleted, so
+        # a process that still maps it keeps valid memory until it notices.
+        if self._current() and self._vectors.shape[1] == dim:
+            return
+        temp_path = f"{self._path}.{os.getpid()}.tmp"
+        vectors = np.memmap(
+            temp_path, dtype=np.float32, mode="w+", shape=(self.max_entries, dim)
+        )
+        vectors.flush()
+        del vectors
+        with self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (dim,))
+        os.replace(temp_path, self._path)
+        self._current()
+
+    def get_setting(self, name: str) -> Optional[int]:
+        with self._locked(exclusive=False):
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_setting(self, name: str, value: int):
+        with self._locked(exclusive=True), self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value)
+            )
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found = {}
+        with self._locked(exclusive=False):
+            if not self._current():
+                return [None] * len(keys)
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                found.update(
+                    self._conn.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN "
+                        f"({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+            if found:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE entries SET last_used = ? WHERE key = ?",
+                        [(time.time(), key) for key in found],
+                    )
+            return [
+                self._vectors[found[key]].tolist() if key in found else None
+                for key in keys
+            ]
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        if not keys:
+            return
+        with self._locked(exclusive=True):
+            self._open(len(vectors[0]))
+            slots = self._allocate(len(keys))
+            for slot, vector in zip(slots, vectors):
+                self._vectors[slot] = vector
+            self._vectors.flush()
+            now = time.time()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                    [(key, slot, now) for key, slot in zip(keys, slots)],
+                )
+
+    def _allocate(self, count: int) -> List[int]:
+        used = {row[0] for row in self._conn.execute("SELECT slot FROM entries")}
+        if len(used) + count > self.max_entries:
+            evict = max(count, self.max_entries // 10)
+            victims = self._conn.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (evict,)
+            ).fetchall()
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims]
+                )
+            used.difference_update(slot for _, slot in victims)
+        free = (slot for slot in range(self.max_entries) if slot not in used)
+        return [next(free) for _ in range(min(count, self.max_entries))]
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only runs the model for text it has not seen.
+
+    Cache keys are a hash of the model name, the kind of text (document or
+    query) and the text itself, so switching models never returns stale
+    vectors.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        store: EmbeddingStore,
+        batch_size: int = 32,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store
+        self.batch_size = batch_size
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        attributes = {"newsllm.embedding.kind": kind}
+        EMBEDDING_BATCH_SIZE.record(len(texts), attributes)
+        with timed_span("embedding.batch", EMBEDDING_DURATION, **attributes):
+            trace.get_current_span().set_attribute(
+                "newsllm.embedding.batch_size", len(texts)
+            )
+            if kind == "query":
+                vectors = [self.underlying.embed_query(texts[0])]
+            else:
+                vectors = self.underlying.embed_documents(texts)
+        # Round through float32 so hits and misses return identical values.
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(
+            f"{self.model_name}\0{kind}\0{text}".encode("utf-8")
+        ).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        vectors = self.store.get_many(keys)
+
+        # Each distinct uncached text is encoded once, in bounded batches of
+        # similar length so little of each batch is padding.
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        missing_keys = sorted(missing, key=lambda key: len(missing[key]))
+        computed = {}
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start : start + self.batch_size]
+            batch_vectors = self._embed(
+                "document", [missing[key] for key in batch_keys]
+            )
+            self.store.put_many(batch_keys, batch_vectors)
+            computed.update(zip(batch_keys, batch_vectors))
+
+        return [
+            vector if vector is not None else computed[key]
+            for key, vector in zip(keys, vectors)
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = self.store.get_many([key])[0]
+        if vector is None:
+            vector = self._embed("query", [text])[0]
+            self.store.put_many([key], [vector])
+        return vector
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from a transformer exported with ``export_onnx``.
+
+    Token embeddings are mean-pooled and L2-normalized, as all-MiniLM-L6-v2
+    does. ``tokenizer.json`` is read from the model's directory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threads: Optional[int] = None,
+        batch_size: int = max(BATCH_SIZE_CANDIDATES),
+        max_length: int = MAX_SEQUENCE_LENGTH,
+    ):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(
+            os.path.join(os.path.dirname(path), "tokenizer.json")
+        )
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        tokens = self.session.run(
+            None, {name: inputs[name] for name in self.input_names}
+        )[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = [
+            self._encode(texts[start : start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def create_embeddings(
+    model_name: str,
+    backend: str = "torch",
+    threads: Optional[int] = None,
+    onnx_path: Optional[str] = None,
+) -> Embeddings:
+    """Load the embedding model on one of ``EMBEDDING_BACKENDS``.
+
+    ``threads`` caps the CPU threads used for inference; for the torch
+    backends this is a process-wide setting. Batching is left to the caller
+    (``CachedEmbeddings``), so the model never splits a batch itself.
+    """
+    if backend == "onnx":
+        if not onnx_path or not os.path.exists(onnx_path):
+            raise ValueError(
+                f"ONNX embedding model {onnx_path!r} not found; create it with "
+                "python embeddings.py --export DIRECTORY"
+            )
+        return OnnxEmbeddings(onnx_path, threads=threads)
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if threads:
+        torch.set_num_threads(threads)
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        encode_kwargs={"batch_size": max(BATCH_SIZE_CANDIDATES)},
+    )
+    if backend == "int8":
+        embeddings.client = torch.quantization.quantize_dynamic(
+            embeddings.client, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return embeddings
+
+
+def cache_model_name(model_name: str, backend: str) -> str:
+    # Each backend gives slightly different vectors; never mix them in the
+    # cache. Plain torch keeps the bare model name of existing caches.
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+
+def tune_batch_size(
+    embeddings: Embeddings,
+    texts: List[str],
+    candidates: Sequence[int] = BATCH_SIZE_CANDIDATES,
+) -> int:
+    """Return the batch size of ``candidates`` that embeds ``texts`` fastest."""
+    embeddings.embed_documents(texts[: candidates[0]])  # warm up
+    best_size, best_rate = candidates[0], 0.0
+    for size in candidates:
+        start = time.perf_counter()
+        for offset in range(0, len(texts), size):
+            embeddings.embed_documents(texts[offset : offset + size])
+        rate = len(texts) / (time.perf_counter() - start)
+        if rate > best_rate:
+            best_size, best_rate = size, rate
+    return best_size
+
+
+def recall_at_k(
+    reference: Embeddings,
+    candidate: Embeddings,
+    documents: List[str],
+    queries: List[str],
+    k: int = 10,
+) -> float:
+    """Share of the reference model's top-``k`` documents the candidate also finds.
+
+    Averaged over ``queries``; 1.0 means the candidate backend retrieves
+    exactly what the reference does.
+    """
+
+    def top_k(embeddings: Embeddings) -> np.ndarray:
+        document_vectors = np.asarray(embeddings.embed_documents(documents))
+        query_vectors = np.asarray([embeddings.embed_query(q) for q in queries])
+        document_vectors /= np.linalg.norm(document_vectors, axis=1, keepdims=True)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        return np.argsort(-(query_vectors @ document_vectors.T), axis=1)[:, :k]
+
+    expected, found = top_k(reference), top_k(candidate)
+    return float(
+        np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(expected, found)])
+    )
+
+
+def export_onnx(model_name: str, directory: str, quantize: bool = True) -> str:
+    """Export a sentence-transformers model to ONNX for ``OnnxEmbeddings``.
+
+    Writes ``model.onnx`` and ``tokenizer.json`` to ``directory`` and, with
+    ``quantize``, an int8 copy ``model.int8.onnx``. Returns the path of the
+    model to serve.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    os.makedirs(directory, exist_ok=True)
+    model.tokenizer.save_pretrained(directory)
+
+    sample = model.tokenizer(["An example sentence."], return_tensors="pt")
+    names = [
+        name
+        for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+    path = os.path.join(directory, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            ({name: sample[name] for name in names},),
+            path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                name: {0: "batch", 1: "sequence"}
+                for name in names + ["last_hidden_state"]
+            },
+            opset_version=17,
+            dynamo=False,
+        )
+    if not quantize:
+        return path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized = os.path.join(directory, "model.int8.onnx")
+    quantize_dynamic(path, quantized, weight_type=QuantType.QInt8)
+    return quantized
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NewsLLM embedding models")
+    parser.add_argument(
+        "--export",
+        metavar="DIRECTORY",
+        required=True,
+        help="export the embedding model to ONNX in this directory",
+    )
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--no-quantize", action="store_true", help="skip the int8 copy")
+    args = parser.parse_args()
+    print(export_onnx(args.model, args.export, quantize=not args.no_quantize))
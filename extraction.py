@@ -0,0 +1,277 @@
+# extraction.py
+
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set
+
+from bs4 import BeautifulSoup, FeatureNotFound
+
+# Parser backends in order of preference. lxml is a C parser and several times
+# faster than the pure-Python html.parser that ships with the standard library.
+PARSER_BACKENDS = ["lxml", "html.parser"]
+
+# Tags that never carry article text.
+BOILERPLATE_TAGS = [
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "iframe",
+    "svg",
+    "nav",
+    "footer",
+    "aside",
+    "form",
+    "button",
+]
+
+# Site chrome named by a whole class or id token: a chrome word, optionally
+# with a namespace in front and structural parts after it ("sidebar",
+# "site-footer", "share-bar"). Tokens such as "ad-free" or "site-content" do not
+# match, and modifiers on the content wrapper ("has-sidebar") are ignored.
+BOILERPLATE_HINTS = re.compile(
+    r"^(?:[a-z0-9]+[-_])*?"
+    r"(nav|navbar|navigation|menu|masthead|footer|sidebar|breadcrumbs?|cookie|"
+    r"consent|subscribe|newsletter|share|sharing|social|related|recommended|"
+    r"comments?|promo|advert|advertisement|ads?|banner|popup|modal)"
+    r"(?:[-_](?:bar|menu|links|list|container|wrapper|wrap|box|area|section|"
+    r"widget|block|module|panel|inner|content|articles|stories|posts|tools|"
+    r"buttons|icons|slot|unit|form|signup|left|right|top|bottom))*$",
+    re.IGNORECASE,
+)
+BOILERPLATE_MODIFIERS = re.compile(r"^(has|no|with|without|is)[-_]", re.IGNORECASE)
+
+# Below this many characters the main-content guess is probably wrong and the
+# whole cleaned page is used instead.
+MIN_MAIN_TEXT_CHARS = 200
+
+# Bump whenever a change here changes the text extracted from a page; cached
+# text from an older version is extracted again.
+EXTRACTOR_VERSION = 2
+
+
+def resolve_parser(preferred: Optional[str] = None) -> str:
+    """Return the first installed parser backend, starting with ``preferred``."""
+    candidates = ([preferred] if preferred else []) + PARSER_BACKENDS
+    for parser in candidates:
+        try:
+            BeautifulSoup("", parser)
+            return parser
+        except FeatureNotFound:
+            continue
+    return "html.parser"
+
+
+def _text_of(node) -> str:
+    return " ".join(node.get_text(separator=" ", strip=True).split())
+
+
+def _is_boilerplate_element(name: str, attrs: Dict) -> bool:
+    if name in ("html", "body", "article", "main"):
+        return False
+    classes = attrs.get("class") or ""
+    if not isinstance(classes, str):
+        classes = " ".join(classes)  # bs4 splits class into a list
+    tokens = f"{classes} {attrs.get('id') or ''}".split()
+    if any(
+        BOILERPLATE_HINTS.match(token) and not BOILERPLATE_MODIFIERS.match(token)
+        for token in tokens
+    ):
+        return True
+    return attrs.get("role") in (
+        "navigation",
+        "banner",
+        "contentinfo",
+        "complementary",
+    )
+
+
+def _is_boilerplate(tag) -> bool:
+    return _is_boilerplate_element(tag.name, tag.attrs)
+
+
+def _main_block(soup: BeautifulSoup, chrome: Set[int]):
+    # Explicit markup wins: pick the largest <article>/<main>/role=main block.
+    marked = soup.find_all(["article", "main"]) + soup.find_all(attrs={"role": "main"})
+    if marked:
+        return max(marked, key=lambda node: len(_text_of(node)))
+
+    # Otherwise the element holding the most paragraph text is the article body.
+    # Paragraphs inside site chrome (comments, related stories) do not count,
+    # unless that leaves nothing to go on.
+    parents, scores, chrome_scores = {}, {}, {}
+    for paragraph in soup.find_all("p"):
+        parent = paragraph.parent
+        if parent is None:
+            continue
+        in_chrome = any(id(node) in chrome for node in paragraph.parents)
+        target = chrome_scores if in_chrome else scores
+        parents[id(parent)] = parent
+        target[id(parent)] = target.get(id(parent), 0) + len(_text_of(paragraph))
+    if sum(scores.values()) < MIN_MAIN_TEXT_CHARS:
+        for key, score in chrome_scores.items():
+            scores[key] = scores.get(key, 0) + score
+    if scores:
+        return parents[max(scores, key=scores.get)]
+    return soup.body or soup
+
+
+def extract_main_text(html: str, parser: str = "html.parser") -> str:
+    """Extract the readable article text from an HTML page.
+
+    Scripts, styles and site chrome (navigation, headers, footers, share bars)
+    are dropped, then the main content block is located. Falls back to the
+    whole cleaned page when no convincing main block is found.
+    """
+    soup = BeautifulSoup(html, parser)
+
+    # Remove script, style and layout elements
+    for tag in soup(BOILERPLATE_TAGS):
+        if not tag.decomposed:
+            tag.decompose()
+
+    # Chrome is located before it is removed, so that an element that looks
+    # like chrome but wraps the main block is kept.
+    chrome = soup.find_all(_is_boilerplate)
+    main = _main_block(soup, {id(tag) for tag in chrome})
+    keep = {id(main)} | {id(node) for node in main.parents}
+    for tag in chrome:
+        if id(tag) not in keep and not tag.decomposed:
+            tag.decompose()
+
+    text = _text_of(main)
+    if len(text) < MIN_MAIN_TEXT_CHARS:
+        text = _text_of(soup)
+    return text
+
+
+class StreamingTextExtractor(HTMLParser):
+    """Incremental counterpart of ``extract_main_text`` for streamed pages.
+
+    Text is collected while chunks are fed in and no document tree is ever
+    built, so memory stays proportional to the extracted text rather than the
+    page size. Boilerplate is skipped with the same rules as the batch
+    extractor; text inside <article>/<main> is preferred when there is enough.
+    """
+
+    VOID_ELEMENTS = {
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "link",
+        "meta",
+        "source",
+        "track",
+        "wbr",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._open: List[tuple] = []  # (tag, is_boilerplate, is_main)
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._all_text: List[str] = []
+        self._main_text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID_ELEMENTS:
+            return
+        attrs = dict(attrs)
+        skip = tag in BOILERPLATE_TAGS or _is_boilerplate_element(tag, attrs)
+        main = tag in ("article", "main") or attrs.get("role") == "main"
+        self._open.append((tag, skip, main))
+        self._skip_depth += skip
+        self._main_depth += main
+
+    def handle_endtag(self, tag):
+        # Close the nearest matching element along with anything left unclosed
+        # inside it; stray end tags are ignored.
+        for index in range(len(self._open) - 1, -1, -1):
+            if self._open[index][0] == tag:
+                for _, skip, main in self._open[index:]:
+                    self._skip_depth -= skip
+                    self._main_depth -= main
+                del self._open[index:]
+                return
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._all_text.append(data)
+        if self._main_depth:
+            self._main_text.append(data)
+
+    def text(self) -> str:
+        self.close()
+        main = " ".join(" ".join(self._main_text).split())
+        if len(main) >= MIN_MAIN_TEXT_CHARS:
+            return main
+        return " ".join(" ".join(self._all_text).split())
+
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w.:-]+)""", re.IGNORECASE)
+
+
+class HtmlStream:
+    """Byte sink for a streamed HTML response.
+
+    Decodes chunks incrementally and either feeds them straight to a
+    ``StreamingTextExtractor`` or buffers them for batch extraction. Reports
+    when the body grows past ``max_bytes`` so the caller can abort the download.
+    """
+
+    def __init__(self, content_type: str, max_bytes: int, incremental: bool):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._charset = self._header_charset(content_type)
+        self._decoder = None
+        self._parts: List[str] = []
+        self._extractor = StreamingTextExtractor() if incremental else None
+
+    @staticmethod
+    def _header_charset(content_type: str) -> Optional[str]:
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "charset":
+                return value.strip().strip("\"'")
+        return None
+
+    def _make_decoder(self, first_chunk: bytes):
+        charset = self._charset
+        if charset is None:
+            match = _META_CHARSET.search(first_chunk[:2048])
+            charset = match.group(1).decode("ascii") if match else "utf-8"
+        try:
+            return codecs.getincrementaldecoder(charset)(errors="replace")
+        except LookupError:
+            return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def _consume(self, text: str):
+        if self._extractor is not None:
+            self._extractor.feed(text)
+        else:
+            self._parts.append(text)
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add a chunk; return False once the body exceeds ``max_bytes``."""
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            return False
+        if self._decoder is None:
+            self._decoder = self._make_decoder(chunk)
+        self._consume(self._decoder.decode(chunk))
+        return True
+
+    def finish(self) -> str:
+        """Return the extracted text, or the decoded HTML in buffered mode."""
+        if self._decoder is not None:
+            self._consume(self._decoder.decode(b"", final=True))
+        if self._extractor is not None:
+            return self._extractor.text()
+        return "".join(self._parts)
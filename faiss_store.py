@@ -0,0 +1,569 @@
+# faiss_store.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.vectorstores import VectorStore
+
+Partition = Tuple[str, str]
+
+
+def _partition_of(metadata: Dict[str, Any]) -> Partition:
+    return (metadata.get("country", ""), metadata.get("topic", ""))
+
+
+def _equalities(where: Optional[Dict]) -> Dict[str, Any]:
+    """Flatten a Chroma-style ``where`` made of equality clauses and ``$and``."""
+    if not where:
+        return {}
+    if "$and" in where:
+        fields = {}
+        for clause in where["$and"]:
+            fields.update(_equalities(clause))
+        return fields
+    fields = {}
+    for key, value in where.items():
+        if isinstance(value, dict):
+            if set(value) != {"$eq"}:
+                raise ValueError(f"Unsupported filter on {key}: {value}")
+            value = value["$eq"]
+        fields[key] = value
+    return fields
+
+
+class PartitionedFaissStore(VectorStore):
+    """Vector store with one flat vector file per (country, topic) partition.
+
+    Every query of the app is filtered to a single country and topic, so each
+    partition keeps its own vectors and a filtered search is an exact (L2)
+    ``faiss.knn`` scan of that partition alone. Texts and metadata live in a
+    SQLite side table whose row IDs identify the vectors.
+
+    A partition is a raw float32 matrix and a parallel int64 array of row IDs
+    on disk, both opened with ``np.memmap``, so opening a store reads nothing
+    and a search only pages in the partition it scans. Writes append to the
+    files, and the ``partitions`` table records how many rows are complete,
+    so readers never see a half-written row. Deleting only removes the side
+    table row; searches skip the dead vectors, and a partition whose dead rows
+    outnumber the live ones (or any partition, on ``vacuum``) is compacted
+    into new files under the next generation number.
+    """
+
+    def __init__(
+        self, directory: str, embedding_function: Embeddings, read_only: bool = False
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        # Partition -> (generation, vectors, row IDs) as currently mapped.
+        self._maps: Dict[Partition, Tuple[int, np.ndarray, np.ndarray]] = {}
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "metadata.sqlite3"), check_same_thread=False
+        )
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    country TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    parent_id TEXT,
+                    document TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_partition ON chunks (country, topic)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_parent ON chunks (parent_id)"
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS partitions (
+                    country TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    generation INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    dim INTEGER NOT NULL,
+                    PRIMARY KEY (country, topic)
+                )
+                """
+            )
+        if not read_only:
+            self._migrate_indexes()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def _path(self, partition: Partition, generation: int, kind: str) -> str:
+        name = hashlib.sha1("|".join(partition).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}-{generation}.{kind}")
+
+    def _state(self, partition: Partition) -> Optional[Tuple[int, int, int]]:
+        # (generation, complete rows, dimension) of a partition, if it exists.
+        return self._conn.execute(
+            "SELECT generation, rows, dim FROM partitions "
+            "WHERE country = ? AND topic = ?",
+            partition,
+        ).fetchone()
+
+    def _arrays(self, partition: Partition) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return the partition's complete vectors and row IDs, memory-mapped."""
+        # Caller holds the lock.
+        state = self._state(partition)
+        if state is None:
+            path = self._legacy_index(partition) if self.read_only else None
+            if path is None:
+                self._maps.pop(partition, None)
+                return None
+            if partition not in self._maps:
+                self._maps[partition] = (-1, *self._read_legacy_index(path))
+            return self._maps[partition][1:]
+        generation, rows, dim = state
+        mapped = self._maps.get(partition)
+        if mapped is None or mapped[0] != generation or len(mapped[2]) < rows:
+            # Opened for the first time, compacted, or grown past the mapping.
+            row_ids = np.memmap(self._path(partition, generation, "ids"), np.int64, "r")
+            vectors = np.memmap(
+                self._path(partition, generation, "vectors"), np.float32, "r"
+            ).reshape(-1, dim)
+            size = min(len(row_ids), len(vectors))
+            mapped = (generation, vectors[:size], row_ids[:size])
+            self._maps[partition] = mapped
+        return mapped[1][:rows], mapped[2][:rows]
+
+    def _append(self, partition: Partition, vectors: np.ndarray, row_ids: List[int]):
+        # Caller holds the lock and an open transaction, which commits the
+        # new row count once both files have been written.
+        state = self._state(partition)
+        if state is None:
+            generation, rows, dim = 0, 0, vectors.shape[1]
+            self._conn.execute(
+                "INSERT INTO partitions VALUES (?, ?, ?, ?, ?)",
+                (*partition, generation, rows, dim),
+            )
+        else:
+            generation, rows, dim = state
+        if vectors.shape[1] != dim:
+            raise ValueError(
+                f"Vectors of dimension {vectors.shape[1]} do not match the "
+                f"{dim}-dimensional partition {partition}"
+            )
+        for kind, data in (
+            ("vectors", vectors),
+            ("ids", np.asarray(row_ids, dtype=np.int64)),
+        ):
+            path = self._path(partition, generation, kind)
+            with open(path, "ab") as f:
+                # Drop any tail a crashed writer left past the complete rows.
+                f.truncate(rows * data[0].nbytes)
+                f.write(data.tobytes())
+        self._conn.execute(
+            "UPDATE partitions SET rows = ? WHERE country = ? AND topic = ?",
+            (rows + len(row_ids), *partition),
+        )
+
+    def _live_rows(self, partition: Partition) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM chunks WHERE country = ? AND topic = ?", partition
+        ).fetchone()[0]
+
+    def _compact_partition(self, partition: Partition):
+        # Caller holds the lock. Rewrites the live vectors under the next
+        # generation; readers still mapping the old files keep valid pages.
+        state = self._state(partition)
+        if state is None:
+            return
+        generation = state[0]
+        vectors, row_ids = self._arrays(partition)
+        live = np.asarray(
+            [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT row_id FROM chunks WHERE country = ? AND topic = ?",
+                    partition,
+                )
+            ],
+            dtype=np.int64,
+        )
+        keep = np.isin(row_ids, live)
+        with self._conn:
+            if keep.any():
+                for kind, data in (
+                    ("vectors", vectors[keep]),
+                    ("ids", row_ids[keep]),
+                ):
+                    with open(self._path(partition, generation + 1, kind), "wb") as f:
+                        f.write(np.ascontiguousarray(data).tobytes())
+                self._conn.execute(
+                    "UPDATE partitions SET generation = ?, rows = ? "
+                    "WHERE country = ? AND topic = ?",
+                    (generation + 1, int(keep.sum()), *partition),
+                )
+            else:
+                self._conn.execute(
+                    "DELETE FROM partitions WHERE country = ? AND topic = ?",
+                    partition,
+                )
+        self._maps.pop(partition, None)
+        for kind in ("vectors", "ids"):
+            path = self._path(partition, generation, kind)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _legacy_index(self, partition: Partition) -> Optional[str]:
+        # Stores written before the vector files kept one FAISS index file
+        # per partition.
+        name = hashlib.sha1("|".join(partition).encode("utf-8")).hexdigest()
+        path = os.path.join(self.directory, f"{name}.index")
+        return path if os.path.exists(path) else None
+
+    def _read_legacy_index(self, path: str) -> Tuple[np.ndarray, np.ndarray]:
+        index = faiss.read_index(path)  # an IndexIDMap2 over an IndexFlatL2
+        row_ids = faiss.vector_to_array(index.id_map)
+        vectors = index.index.reconstruct_n(0, index.ntotal)
+        order = np.argsort(row_ids)
+        return vectors[order], row_ids[order]
+
+    def _migrate_indexes(self):
+        # A writer moves the vectors of legacy index files over once; a
+        # read-only store loads them into memory instead, in ``_arrays``.
+        for partition in self._partitions():
+            partition = tuple(partition)
+            path = self._legacy_index(partition)
+            if path is None:
+                continue
+            vectors, row_ids = self._read_legacy_index(path)
+            with self._lock, self._conn:
+                if self._state(partition) is None and len(row_ids):
+                    self._append(partition, vectors, row_ids.tolist())
+            os.remove(path)
+
+    def _require_writable(self):
+        if self.read_only:
+            raise RuntimeError("This FAISS store was opened read-only")
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """Add or replace texts; existing IDs are overwritten like a Chroma upsert."""
+        self._require_writable()
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        if ids is None:
+            ids = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        self._add(ids, texts, self.embedding_function.embed_documents(texts), metadatas)
+        return ids
+
+    def add_embeddings(
+        self,
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        ids: List[str],
+    ) -> List[str]:
+        """Add or replace precomputed vectors whose text is kept elsewhere."""
+        self._require_writable()
+        if ids:
+            self._add(ids, [""] * len(ids), embeddings, metadatas)
+        return ids
+
+    def _add(
+        self,
+        ids: List[str],
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+    ):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self._delete_rows(
+                self._conn.execute(
+                    f"SELECT row_id, country, topic FROM chunks WHERE id IN "
+                    f"({','.join('?' * len(ids))})",
+                    ids,
+                ).fetchall()
+            )
+            # Partition -> (positions in this batch, row IDs)
+            added: Dict[Partition, Tuple[List[int], List[int]]] = {}
+            with self._conn:
+                for position, (doc_id, text, metadata) in enumerate(
+                    zip(ids, texts, metadatas)
+                ):
+                    partition = _partition_of(metadata)
+                    cursor = self._conn.execute(
+                        "INSERT INTO chunks "
+                        "(id, country, topic, parent_id, document, metadata) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            doc_id,
+                            *partition,
+                            metadata.get("parent_id"),
+                            text,
+                            json.dumps(metadata),
+                        ),
+                    )
+                    positions, row_ids = added.setdefault(partition, ([], []))
+                    positions.append(position)
+                    row_ids.append(cursor.lastrowid)
+                for partition, (positions, row_ids) in added.items():
+                    self._append(partition, vectors[positions], row_ids)
+
+    def _delete_rows(self, rows: List[Tuple[int, str, str]]):
+        # Caller holds the lock. The vectors stay on disk until compaction.
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE row_id = ?", [(row[0],) for row in rows]
+            )
+        for partition in {(country, topic) for _, country, topic in rows}:
+            state = self._state(partition)
+            if state is not None and 2 * self._live_rows(partition) < state[1]:
+                self._compact_partition(partition)
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        parent_ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ):
+        """Delete chunks by ID and/or every chunk of the given parent articles."""
+        self._require_writable()
+        with self._lock:
+            rows = []
+            for column, values in (("id", ids), ("parent_id", parent_ids)):
+                values = list(values or [])
+                for start in range(0, len(values), 500):
+                    chunk = values[start : start + 500]
+                    rows.extend(
+                        self._conn.execute(
+                            f"SELECT row_id, country, topic FROM chunks "
+                            f"WHERE {column} IN ({','.join('?' * len(chunk))})",
+                            chunk,
+                        ).fetchall()
+                    )
+            self._delete_rows(list(dict.fromkeys(rows)))
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, List]:
+        """Chroma-compatible ``get`` over IDs and country/topic equality filters."""
+        include = include or ["metadatas", "documents"]
+        clauses, params = [], []
+        for key, value in _equalities(where).items():
+            if key not in ("country", "topic", "parent_id"):
+                raise ValueError(f"Unsupported filter field: {key}")
+            clauses.append(f"{key} = ?")
+            params.append(value)
+        if ids is not None:
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        query = "SELECT row_id, id, country, topic, document, metadata FROM chunks"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY row_id", params).fetchall()
+            result: Dict[str, List] = {"ids": [row[1] for row in rows]}
+            if "metadatas" in include:
+                result["metadatas"] = [json.loads(row[5]) for row in rows]
+            if "documents" in include:
+                result["documents"] = [row[4] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = [
+                    self._vector((row[2], row[3]), row[0]).tolist() for row in rows
+                ]
+        return result
+
+    def _vector(self, partition: Partition, row_id: int) -> np.ndarray:
+        # Caller holds the lock. Row IDs are appended in increasing order.
+        vectors, row_ids = self._arrays(partition)
+        return np.asarray(vectors[np.searchsorted(row_ids, row_id)])
+
+    def _partitions(self) -> List[Partition]:
+        return self._conn.execute(
+            "SELECT DISTINCT country, topic FROM chunks"
+        ).fetchall()
+
+    def _search(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict] = None,
+        with_vectors: bool = False,
+    ) -> List[Tuple[Document, float, Optional[np.ndarray]]]:
+        fields = _equalities(filter)
+        query = np.asarray([embedding], dtype=np.float32)
+        with self._lock:
+            if "country" in fields and "topic" in fields:
+                partitions = [(fields["country"], fields["topic"])]
+            else:
+                partitions = [
+                    partition
+                    for partition in self._partitions()
+                    if all(
+                        fields.get(key, value) == value
+                        for key, value in zip(("country", "topic"), partition)
+                    )
+                ]
+            hits: List[Tuple[float, int, Partition, int]] = []
+            for partition in partitions:
+                partition = tuple(partition)
+                arrays = self._arrays(partition)
+                if arrays is None or len(arrays[1]) == 0:
+                    continue
+                vectors, row_ids = arrays
+                # Deleted vectors are still scanned until compaction, so ask
+                # for enough neighbours to have k live ones left.
+                dead = len(row_ids) - self._live_rows(partition)
+                distances, positions = faiss.knn(
+                    query, vectors, min(k + dead, len(row_ids))
+                )
+                hits.extend(
+                    (float(distance), int(row_ids[position]), partition, position)
+                    for distance, position in zip(distances[0], positions[0])
+                    if position != -1
+                )
+            if not hits:
+                return []
+            rows = {}
+            row_ids = [row_id for _, row_id, _, _ in hits]
+            for start in range(0, len(row_ids), 500):
+                chunk = row_ids[start : start + 500]
+                rows.update(
+                    (row[0], row[1:])
+                    for row in self._conn.execute(
+                        f"SELECT row_id, id, document, metadata FROM chunks "
+                        f"WHERE row_id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+            live = [hit for hit in sorted(hits) if hit[1] in rows][:k]
+            return [
+                (
+                    Document(
+                        id=rows[row_id][0],
+                        page_content=rows[row_id][1],
+                        metadata=json.loads(rows[row_id][2]),
+                    ),
+                    distance,
+                    (
+                        np.asarray(self._arrays(partition)[0][position])
+                        if with_vectors
+                        else None
+                    ),
+                )
+                for distance, row_id, partition, position in live
+            ]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict] = None
+    ) -> List[Tuple[Document, float]]:
+        return [
+            (document, distance)
+            for document, distance, _ in self._search(embedding, k, filter)
+        ]
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        candidates = self._search(embedding, fetch_k, filter, with_vectors=True)
+        if not candidates:
+            return []
+        selected = maximal_marginal_relevance(
+            np.asarray(embedding, dtype=np.float32),
+            [vector for _, _, vector in candidates],
+            lambda_mult=lambda_mult,
+            k=k,
+        )
+        return [candidates[i][0] for i in selected]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+        )
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self.embedding_function.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score(query, k, filter)
+        ]
+
+    def vacuum(self):
+        """Compact every partition with deleted vectors and the side table."""
+        with self._lock:
+            for partition in self._partitions():
+                partition = tuple(partition)
+                state = self._state(partition)
+                if state is not None and self._live_rows(partition) < state[1]:
+                    self._compact_partition(partition)
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._maps.clear()
+            self._conn.close()
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        directory: str = "./faiss_index",
+        **kwargs: Any,
+    ) -> "PartitionedFaissStore":
+        store = cls(directory, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
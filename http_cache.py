@@ -0,0 +1,133 @@
+# http_cache.py
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Mapping, NamedTuple, Optional
+
+
+class CachedPage(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    text: str
+    extractor: Optional[str]
+
+
+class HttpCache:
+    """Persistent cache of extracted page text keyed by URL, for conditional GETs.
+
+    Only pages served with an ``ETag`` or ``Last-Modified`` header are kept,
+    since nothing else can be revalidated. A ``304 Not Modified`` answer to
+    the validators from ``conditional_headers`` means the cached text is still
+    current, so the page is neither downloaded nor parsed again. Once the
+    stored text exceeds ``max_bytes``, the least recently used pages are
+    evicted.
+
+    Each page records the ``extractor`` that produced its text. A page
+    extracted by any other one is a miss, so a change to the extraction rules
+    re-downloads pages instead of serving their old text indefinitely.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 200_000_000):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(pages)")]
+            if "extractor" not in columns:
+                self._conn.execute("ALTER TABLE pages ADD COLUMN extractor TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)"
+            )
+
+    def get(self, url: str, extractor: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, text, extractor FROM pages "
+                "WHERE url = ? AND extractor = ?",
+                (url, extractor),
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE pages SET last_used = ? WHERE url = ?", (time.time(), url)
+                )
+        return CachedPage(*row)
+
+    @staticmethod
+    def conditional_headers(page: Optional[CachedPage]) -> Dict[str, str]:
+        """Request headers that let the server answer 304 for ``page``."""
+        headers = {}
+        if page is not None:
+            if page.etag:
+                headers["If-None-Match"] = page.etag
+            if page.last_modified:
+                headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def put(
+        self,
+        url: str,
+        response_headers: Mapping[str, str],
+        text: str,
+        extractor: str,
+    ):
+        """Store the text of a fresh response, if the server gave validators."""
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not (etag or last_modified) or "no-store" in response_headers.get(
+            "Cache-Control", ""
+        ):
+            self.discard(url)
+            return
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages "
+                "(url, etag, last_modified, text, size, last_used, extractor) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, text, size, time.time(), extractor),
+            )
+            self._evict()
+
+    def discard(self, url: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def _evict(self):
+        # Caller holds the lock and an open transaction.
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% so a full cache is not trimmed on every insert.
+        excess = total - int(self.max_bytes * 0.9)
+        victims = []
+        for url, size in self._conn.execute(
+            "SELECT url, size FROM pages ORDER BY last_used"
+        ):
+            victims.append((url,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM pages WHERE url = ?", victims)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,100 @@
+# journal.py
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+
+def _write_json(path: str, value):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(value, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class RefreshJournal:
+    """On-disk checkpoints of a database refresh in progress.
+
+    Each finished (country, topic) scrape job is written to its own file
+    before its articles are queued for ingestion, and the IDs of every batch
+    written to the store are appended to an ingest log. A refresh that dies
+    part-way resumes from the journal: finished jobs are not scraped again and
+    ingested articles are not re-embedded. The journal is bound to the store it
+    writes into, and the ingest log is dropped when that store changes.
+    """
+
+    def __init__(self, directory: str, max_age_seconds: float):
+        self.directory = directory
+        self._jobs_dir = os.path.join(directory, "jobs")
+        self._state_path = os.path.join(directory, "state.json")
+        self._ingested_path = os.path.join(directory, "ingested.log")
+        self.state: Dict = {}
+        if os.path.exists(self._state_path):
+            try:
+                with open(self._state_path, "r") as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = {}
+            # Scraped results this old would make a stale refresh.
+            if time.time() - self.state.get("started", 0) > max_age_seconds:
+                self.clear()
+        if not self.state:
+            os.makedirs(self._jobs_dir, exist_ok=True)
+            self.state = {"started": time.time(), "base": None, "build": None}
+            _write_json(self._state_path, self.state)
+
+    @property
+    def base(self) -> Optional[str]:
+        return self.state.get("base")
+
+    @property
+    def build(self) -> Optional[str]:
+        return self.state.get("build")
+
+    def bind(self, base: str, build: Optional[str]):
+        """Record the store being written: its base directory and snapshot build.
+
+        Articles ingested into any other store are not in this one, so the
+        ingest log is reset when either changes.
+        """
+        if (base, build) == (self.base, self.build):
+            return
+        if os.path.exists(self._ingested_path):
+            os.remove(self._ingested_path)
+        self.state.update(base=base, build=build)
+        _write_json(self._state_path, self.state)
+
+    def _job_path(self, country: str, topic: str) -> str:
+        name = hashlib.sha1(f"{country}|{topic}".encode("utf-8")).hexdigest()
+        return os.path.join(self._jobs_dir, f"{name}.json")
+
+    def has_job(self, country: str, topic: str) -> bool:
+        return os.path.exists(self._job_path(country, topic))
+
+    def save_job(self, country: str, topic: str, articles: List[Dict[str, str]]):
+        _write_json(self._job_path(country, topic), articles)
+
+    def load_job(self, country: str, topic: str) -> List[Dict[str, str]]:
+        with open(self._job_path(country, topic), "r") as f:
+            return json.load(f)
+
+    def ingested(self) -> Set[str]:
+        if not os.path.exists(self._ingested_path):
+            return set()
+        with open(self._ingested_path, "r") as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def mark_ingested(self, doc_ids: Iterable[str]):
+        with open(self._ingested_path, "a") as f:
+            f.writelines(f"{doc_id}\n" for doc_id in doc_ids)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.state = {}
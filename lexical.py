@@ -0,0 +1,181 @@
+# lexical.py
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# Common English words that carry no signal for matching news passages.
+STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "are",
+    "as",
+    "at",
+    "be",
+    "by",
+    "for",
+    "from",
+    "has",
+    "he",
+    "in",
+    "is",
+    "it",
+    "its",
+    "of",
+    "on",
+    "or",
+    "that",
+    "the",
+    "to",
+    "was",
+    "were",
+    "will",
+    "with",
+}
+
+# Standard BM25 parameters.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token
+        for token in re.findall(r"\w+", text.lower())
+        if token not in STOPWORDS and len(token) > 1
+    ]
+
+
+class LexicalIndex:
+    """Inverted index for BM25 ranking of chunks, stored in SQLite.
+
+    Postings are added and removed together with the chunks in the vector
+    store, so the index never needs a rebuild. Statistics (document count,
+    average length, document frequencies) are computed per country/topic
+    partition at query time from the postings themselves.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    parent_id TEXT,
+                    partition TEXT NOT NULL,
+                    length INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS postings_term ON postings (term)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_parent ON chunks (parent_id)"
+            )
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+
+    def add(self, chunks: Iterable[Tuple[str, str, str, str]]):
+        """Index ``(chunk_id, parent_id, partition, text)`` tuples, replacing old ones."""
+        chunks = list(chunks)
+        with self._lock, self._conn:
+            self._remove([chunk_id for chunk_id, _, _, _ in chunks])
+            for chunk_id, parent_id, partition, text in chunks:
+                counts = Counter(tokenize(text))
+                self._conn.execute(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                    (chunk_id, parent_id, partition, sum(counts.values())),
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()],
+                )
+
+    def _remove(self, chunk_ids: List[str]):
+        # Caller holds the lock and an open transaction.
+        self._conn.executemany(
+            "DELETE FROM postings WHERE chunk_id = ?", [(i,) for i in chunk_ids]
+        )
+        self._conn.executemany(
+            "DELETE FROM chunks WHERE chunk_id = ?", [(i,) for i in chunk_ids]
+        )
+
+    def remove(self, chunk_ids: Iterable[str]):
+        with self._lock, self._conn:
+            self._remove(list(chunk_ids))
+
+    def remove_parents(self, parent_ids: Iterable[str]):
+        """Remove every chunk of the given articles."""
+        parent_ids = list(parent_ids)
+        with self._lock, self._conn:
+            chunk_ids = []
+            for start in range(0, len(parent_ids), 500):
+                batch = parent_ids[start : start + 500]
+                chunk_ids.extend(
+                    row[0]
+                    for row in self._conn.execute(
+                        f"SELECT chunk_id FROM chunks WHERE parent_id IN "
+                        f"({','.join('?' * len(batch))})",
+                        batch,
+                    )
+                )
+            self._remove(chunk_ids)
+
+    def search(
+        self, query: str, partition: str, k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """Return up to ``k`` ``(chunk_id, score)`` pairs ranked by BM25."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            count, total_length = self._conn.execute(
+                "SELECT COUNT(*), SUM(length) FROM chunks WHERE partition = ?",
+                (partition,),
+            ).fetchone()
+            if not count:
+                return []
+            rows = self._conn.execute(
+                "SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p "
+                "JOIN chunks c ON c.chunk_id = p.chunk_id "
+                f"WHERE c.partition = ? AND p.term IN ({','.join('?' * len(terms))})",
+                [partition] + terms,
+            ).fetchall()
+
+        average_length = total_length / count or 1
+        frequencies = Counter(term for term, _, _, _ in rows)
+        scores: Dict[str, float] = {}
+        for term, chunk_id, tf, length in rows:
+            df = frequencies[term]
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            scores[chunk_id] = (
+                scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+            )
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,124 @@
+# memory.py
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from analysis import estimate_tokens
+
+# Prompt budget for the verbatim recent turns, in (estimated) tokens.
+HISTORY_TOKEN_BUDGET = 1200
+# Length cap the summarizer is asked to keep the running summary under.
+SUMMARY_MAX_WORDS = 250
+
+
+def _format_turn(role: str, content: str) -> str:
+    return f"{role}: {content}"
+
+
+def _truncate(text: str, token_budget: int) -> str:
+    # Inverse of estimate_tokens; keeps the start, which for the analysis
+    # message is the summary section.
+    max_chars = token_budget * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + " ..."
+
+
+class ConversationMemory:
+    """Chat history for the prompt, bounded however long the chat runs.
+
+    The prompt gets a running summary of older turns followed by the most
+    recent turns verbatim, newest first into ``window_tokens``. When
+    ``history`` is built for a chat turn and the turns not yet summarized
+    exceed the window, the oldest of them are handed to
+    ``summarize(summary, turns) -> summary`` through ``submit`` (an
+    executor's ``submit``), so the model call happens off the response path.
+    Adding turns never calls the model, so an analysis that is shown but not
+    chatted about costs nothing. The summary is picked up by a later
+    ``history`` call; until then those turns stay in the window, trimmed to
+    the budget, and a failed summarization is simply retried on the next.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str, str], str],
+        submit: Callable[..., Future],
+        window_tokens: int = HISTORY_TOKEN_BUDGET,
+    ):
+        self.summarize = summarize
+        self.submit = submit
+        self.window_tokens = window_tokens
+        self.summary = ""
+        self._lock = threading.Lock()
+        self._turns: List[Tuple[str, str]] = []
+        # Turns before this index are covered by ``summary``.
+        self._summarized = 0
+        self._pending: Optional[Tuple[Future, int]] = None
+
+    def add(self, role: str, content: str):
+        with self._lock:
+            self._turns.append((role, content))
+
+    def history(self) -> str:
+        """The summary and recent turns, formatted for ``CHAT_RESPONSE_PROMPT``."""
+        with self._lock:
+            self._collect()
+            self._compact()
+            recent: List[str] = []
+            budget = self.window_tokens
+            for role, content in reversed(self._turns[self._summarized :]):
+                turn = _format_turn(role, content)
+                if not recent:
+                    # The latest turn is always kept, if need be in part.
+                    turn = _truncate(turn, budget)
+                elif estimate_tokens(turn) > budget:
+                    break
+                recent.append(turn)
+                budget -= estimate_tokens(turn)
+            summary = self.summary
+        parts = []
+        if summary:
+            parts.append(f"Summary of the earlier conversation: {summary}")
+        parts.extend(reversed(recent))
+        return "\n".join(parts)
+
+    def _collect(self):
+        # Caller holds the lock. Applies a finished summarization, if any.
+        if self._pending is None or not self._pending[0].done():
+            return
+        future, upto = self._pending
+        self._pending = None
+        try:
+            summary = future.result()
+        except Exception as e:
+            print(f"Error summarizing the conversation: {str(e)}")
+            return
+        if summary:
+            self.summary = summary
+            self._summarized = upto
+
+    def _compact(self):
+        # Caller holds the lock. Folds the oldest unsummarized turns into the
+        # summary once they overflow the window, leaving half the window so
+        # that the next few turns do not trigger another call straight away.
+        if self._pending is not None:
+            return
+        unsummarized = self._turns[self._summarized :]
+        sizes = [estimate_tokens(_format_turn(*turn)) for turn in unsummarized]
+        if sum(sizes) <= self.window_tokens:
+            return
+        # The newest turn always stays verbatim.
+        kept, upto = sizes[-1], len(self._turns) - 1
+        for size in reversed(sizes[1:-1]):
+            if kept + size > self.window_tokens // 2:
+                break
+            kept += size
+            upto -= 1
+        if upto == self._summarized:
+            return
+        turns = "\n".join(
+            _format_turn(role, _truncate(content, self.window_tokens))
+            for role, content in self._turns[self._summarized : upto]
+        )
+        self._pending = (self.submit(self.summarize, self.summary, turns), upto)
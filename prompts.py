@@ -85,7 +85,7 @@ Would you like to know more? Here are some follow-up questions:
 )
 
 CHAT_RESPONSE_PROMPT = PromptTemplate(
-    input_variables=["country", "topic", "user_input", "chat_history"],
+    input_variables=["country", "topic", "user_input", "chat_history", "context"],
     template="""You are an AI assistant specializing in news analysis for {country} on the topic of {topic}. The user has asked the following question or made the following statement:
 
 {user_input}
@@ -93,9 +93,12 @@ CHAT_RESPONSE_PROMPT = PromptTemplate(
 Previous conversation context:
 {chat_history}
 
+Relevant passages from recent news articles:
+{context}
+
 Please provide a thoughtful and informative response that:
 1. Directly addresses the user's input
-2. Considers the context of the previous conversation
+2. Considers the context of the previous conversation and is grounded in the news passages above
 3. Provides relevant background information or context
 4. Cites specific examples, data points, or sources when applicable
 5. Maintains an objective and balanced perspective
@@ -112,3 +115,17 @@ Do not include any titles or headings in your response, use the following format
 ```
 """,
 )
+
+CONVERSATION_SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["country", "topic", "summary", "turns", "max_words"],
+    template="""You maintain a running summary of a conversation between a user and an AI assistant about news in {country} on the topic of {topic}.
+
+Current summary of the conversation so far:
+{summary}
+
+New messages to fold into the summary:
+{turns}
+
+Rewrite the summary so that it also covers the new messages. Keep the key facts, figures and sources the assistant gave, the questions the user asked, and any preferences or corrections the user stated. Drop greetings, formatting and repetition. Use at most {max_words} words of plain prose, with no titles or headings.
+""",
+)
@@ -1,18 +1,90 @@
 # scraper.py
 
+import asyncio
+import multiprocessing
 import random
 import time
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
-from googlesearch import search
+from discovery import DiscoveryBackend, GoogleSearchDiscovery
+from extraction import (
+    EXTRACTOR_VERSION,
+    HtmlStream,
+    extract_main_text,
+    resolve_parser,
+)
+from http_cache import CachedPage, HttpCache
+from opentelemetry import trace
 from requests.adapters import HTTPAdapter
+from telemetry import (
+    DISCOVERY_DURATION,
+    EXTRACT_DURATION,
+    FETCH_BYTES,
+    FETCH_DURATION,
+    timed_span,
+)
 from urllib3.util import Retry
 
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+CHUNK_SIZE = 64 * 1024
+
+
+class DomainThrottle:
+    """Per-host politeness for the async scraper.
+
+    Caps the number of in-flight requests to each domain and spaces request
+    starts to the same domain by a random delay, so unrelated hosts never wait
+    on each other.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        min_delay: float = 1.0,
+        max_delay: float = 3.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    async def __call__(self, url: str) -> asyncio.Semaphore:
+        domain = urlsplit(url).netloc.lower()
+        semaphore = self._semaphores.setdefault(
+            domain, asyncio.Semaphore(self.max_concurrency)
+        )
+        await semaphore.acquire()
+
+        # Reserve the next start slot for this domain; no await between the
+        # read and the write, so slots are handed out in order.
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot.get(domain, now))
+        self._next_slot[domain] = slot + random.uniform(self.min_delay, self.max_delay)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        return semaphore
+
 
 class NewsScraper:
-    def __init__(self):
+    def __init__(
+        self,
+        per_domain_concurrency: int = 2,
+        per_domain_delay: Tuple[float, float] = (1.0, 3.0),
+        max_connections: int = 64,
+        search_concurrency: int = 2,
+        extraction_workers: int = 0,
+        parser: Optional[str] = None,
+        max_bytes: int = 2_000_000,
+        streaming_extraction: bool = False,
+        http_cache: Optional[HttpCache] = None,
+        discovery: Optional[DiscoveryBackend] = None,
+    ):
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -25,6 +97,20 @@ class NewsScraper:
         self.session.mount(
             "https://", HTTPAdapter(max_retries=Retry(total=3, backoff_factor=1))
         )
+        self.per_domain_concurrency = per_domain_concurrency
+        self.per_domain_delay = per_domain_delay
+        self.max_connections = max_connections
+        self.search_concurrency = search_concurrency
+        # search_concurrency only applies to the default Google backend.
+        self.discovery = discovery or GoogleSearchDiscovery(
+            max_concurrency=search_concurrency
+        )
+        self.extraction_workers = extraction_workers
+        self.parser = resolve_parser(parser)
+        self._extraction_pool: Optional[ProcessPoolExecutor] = None
+        self.max_bytes = max_bytes
+        self.streaming_extraction = streaming_extraction
+        self.http_cache = http_cache
 
     def _get_random_headers(self):
         return {
@@ -33,48 +119,198 @@ class NewsScraper:
             "Referer": "https://www.google.com/",
         }
 
+    def _traced_discovery(self, country: str, topic: str):
+        return timed_span(
+            "news.discover",
+            DISCOVERY_DURATION,
+            **{
+                "newsllm.country": country,
+                "newsllm.topic": topic,
+                "newsllm.discovery": self.discovery.name,
+            },
+        )
+
     def search_news(self, country: str, topic: str, num_results: int = 10) -> List[str]:
-        query = f"{country} {topic} news"
-        if country.lower() == "international":
-            query = f"international {topic} news"
+        with self._traced_discovery(country, topic):
+            urls = self.discovery.discover(country, topic, num_results)
+            trace.get_current_span().set_attribute("newsllm.results", len(urls))
+        return urls
 
-        urls = list(search(query, num=num_results, stop=num_results, pause=2))
+    async def search_news_async(
+        self,
+        country: str,
+        topic: str,
+        num_results: int = 10,
+        client: Optional[aiohttp.ClientSession] = None,
+    ) -> List[str]:
+        with self._traced_discovery(country, topic):
+            urls = await self.discovery.discover_async(
+                country, topic, num_results, client
+            )
+            trace.get_current_span().set_attribute("newsllm.results", len(urls))
         return urls
 
+    @staticmethod
+    @contextmanager
+    def _traced_fetch(url: str) -> Iterator[Dict]:
+        domain = urlsplit(url).netloc.lower()
+        with timed_span(
+            "news.fetch", FETCH_DURATION, **{"server.address": domain}
+        ) as attributes:
+            trace.get_current_span().set_attribute("url.full", url)
+            yield attributes
+
+    @staticmethod
+    def _record_body_size(attributes: Dict, size: int):
+        trace.get_current_span().set_attribute("http.response.body.size", size)
+        FETCH_BYTES.record(size, {"server.address": attributes["server.address"]})
+
+    def _accepts(self, url: str, headers) -> bool:
+        # Decide from the headers alone, before any of the body is read.
+        mime = headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if mime and mime not in HTML_CONTENT_TYPES:
+            print(f"Skipping {url}: unsupported content type {mime}")
+            return False
+        length = headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            print(f"Skipping {url}: {length} bytes exceeds {self.max_bytes}")
+            return False
+        return True
+
+    @property
+    def _extractor(self) -> str:
+        # Text depends on the extraction rules and on what applies them: the
+        # streaming extractor or a parser backend.
+        mode = "streaming" if self.streaming_extraction else self.parser
+        return f"{mode}-{EXTRACTOR_VERSION}"
+
+    def _cached_page(self, url: str) -> Optional[CachedPage]:
+        if self.http_cache is None:
+            return None
+        return self.http_cache.get(url, self._extractor)
+
+    def _request_headers(self, cached: Optional[CachedPage]) -> Dict[str, str]:
+        return {**self._get_random_headers(), **HttpCache.conditional_headers(cached)}
+
+    def _cache_page(self, url: str, headers, text: str):
+        if self.http_cache is None:
+            return
+        if text:
+            self.http_cache.put(url, headers, text, self._extractor)
+        else:
+            self.http_cache.discard(url)
+
+    def _open_stream(self, headers) -> HtmlStream:
+        return HtmlStream(
+            headers.get("Content-Type", ""),
+            max_bytes=self.max_bytes,
+            incremental=self.streaming_extraction,
+        )
+
     def scrape_content(self, url: str) -> str:
-        try:
-            response = self.session.get(
-                url, headers=self._get_random_headers(), timeout=10
+        cached = self._cached_page(url)
+        with self._traced_fetch(url) as attributes:
+            try:
+                with self.session.get(
+                    url, headers=self._request_headers(cached), timeout=10, stream=True
+                ) as response:
+                    attributes["http.response.status_code"] = response.status_code
+                    if response.status_code == 304 and cached is not None:
+                        # Unchanged since the cached copy: no body, no parsing.
+                        return cached.text
+                    response.raise_for_status()
+                    response_headers = response.headers
+                    if not self._accepts(url, response.headers):
+                        return ""
+                    page = self._open_stream(response.headers)
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if not page.feed(chunk):
+                            print(
+                                f"Skipping {url}: body exceeds {self.max_bytes} bytes"
+                            )
+                            return ""
+                    self._record_body_size(attributes, page.size)
+            except requests.exceptions.HTTPError as http_err:
+                self._report_http_error(url, response.status_code, http_err)
+                return ""
+            except requests.exceptions.RequestException as req_err:
+                print(f"Error scraping {url}: {str(req_err)}")
+                attributes["error.type"] = type(req_err).__name__
+                return ""
+
+        if self.streaming_extraction:
+            # The text was extracted while the body streamed in; this only
+            # flushes the parser.
+            with timed_span(
+                "news.extract", EXTRACT_DURATION, **{"newsllm.extraction": "streaming"}
+            ):
+                text = page.finish()
+        else:
+            text = self.extract_text(page.finish())
+        self._cache_page(url, response_headers, text)
+        return text
+
+    def open_extraction_pool(self):
+        """Start the worker processes that parse HTML off the GIL.
+
+        Workers come from a fork server (or are spawned where there is none)
+        rather than being forked from this process, which may already be
+        running the ingest consumer, the scheduler or Streamlit's threads, so
+        they never inherit a lock some other thread held at fork time.
+        """
+        if self.extraction_workers <= 0 or self._extraction_pool is not None:
+            return
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        if context.get_start_method() == "forkserver":
+            # The server imports only the extractor, not the calling script.
+            context.set_forkserver_preload(["extraction"])
+        self._extraction_pool = ProcessPoolExecutor(
+            max_workers=self.extraction_workers, mp_context=context
+        )
+        list(self._extraction_pool.map(int, range(self.extraction_workers)))
+
+    def close_extraction_pool(self):
+        if self._extraction_pool is not None:
+            self._extraction_pool.shutdown()
+            self._extraction_pool = None
+
+    def _traced_extract(self):
+        mode = "inline" if self._extraction_pool is None else "pool"
+        return timed_span(
+            "news.extract", EXTRACT_DURATION, **{"newsllm.extraction": mode}
+        )
+
+    def extract_text(self, html: str) -> str:
+        with self._traced_extract():
+            if self._extraction_pool is None:
+                return extract_main_text(html, self.parser)
+            return self._extraction_pool.submit(
+                extract_main_text, html, self.parser
+            ).result()
+
+    async def extract_text_async(self, html: str) -> str:
+        with self._traced_extract():
+            if self._extraction_pool is None:
+                return await asyncio.to_thread(extract_main_text, html, self.parser)
+            return await asyncio.get_running_loop().run_in_executor(
+                self._extraction_pool, extract_main_text, html, self.parser
             )
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            # Get text content
-            text = soup.get_text(separator=" ", strip=True)
-
-            # Remove extra whitespace
-            text = " ".join(text.split())
-
-            return text
-        except requests.exceptions.HTTPError as http_err:
-            if response.status_code == 401:
-                print(f"Error scraping {url}: 401 Unauthorized. Access forbidden.")
-            elif response.status_code == 403:
-                print(
-                    f"Error scraping {url}: 403 Forbidden. You do not have permission to access this page."
-                )
-            elif response.status_code == 405:
-                print(f"Error scraping {url}: 405 Method Not Allowed.")
-            else:
-                print(f"HTTP error occurred: {http_err}")
-            return ""
-        except requests.exceptions.RequestException as req_err:
-            print(f"Error scraping {url}: {str(req_err)}")
-            return ""
+
+    @staticmethod
+    def _report_http_error(url: str, status_code: int, http_err: Exception):
+        if status_code == 401:
+            print(f"Error scraping {url}: 401 Unauthorized. Access forbidden.")
+        elif status_code == 403:
+            print(
+                f"Error scraping {url}: 403 Forbidden. You do not have permission to access this page."
+            )
+        elif status_code == 405:
+            print(f"Error scraping {url}: 405 Method Not Allowed.")
+        else:
+            print(f"HTTP error occurred: {http_err}")
 
     def scrape_news(
         self, country: str, topics: List[str], urls_per_topic: int = 5
@@ -95,6 +331,119 @@ class NewsScraper:
 
         return results
 
+    async def scrape_content_async(
+        self,
+        client: aiohttp.ClientSession,
+        throttle: DomainThrottle,
+        url: str,
+        retries: int = 3,
+    ) -> str:
+        cached = self._cached_page(url)
+        for attempt in range(retries + 1):
+            semaphore = await throttle(url)
+            held = True
+            try:
+                with self._traced_fetch(url) as attributes:
+                    async with client.get(
+                        url, headers=self._request_headers(cached)
+                    ) as response:
+                        attributes["http.response.status_code"] = response.status
+                        if response.status == 304 and cached is not None:
+                            return cached.text
+                        response.raise_for_status()
+                        response_headers = response.headers
+                        if not self._accepts(url, response.headers):
+                            return ""
+                        page = self._open_stream(response.headers)
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            if not page.feed(chunk):
+                                print(
+                                    f"Skipping {url}: body exceeds {self.max_bytes} bytes"
+                                )
+                                return ""
+                        self._record_body_size(attributes, page.size)
+                # The body is in; other fetches from the domain need not wait
+                # for it to be parsed.
+                semaphore.release()
+                held = False
+                if self.streaming_extraction:
+                    with timed_span(
+                        "news.extract",
+                        EXTRACT_DURATION,
+                        **{"newsllm.extraction": "streaming"},
+                    ):
+                        text = page.finish()
+                else:
+                    text = await self.extract_text_async(page.finish())
+                self._cache_page(url, response_headers, text)
+                return text
+            except aiohttp.ClientResponseError as http_err:
+                if http_err.status < 500 or attempt == retries:
+                    self._report_http_error(url, http_err.status, http_err)
+                    return ""
+            except (aiohttp.ClientError, asyncio.TimeoutError) as req_err:
+                if attempt == retries:
+                    print(
+                        f"Error scraping {url}: {str(req_err) or type(req_err).__name__}"
+                    )
+                    return ""
+            finally:
+                if held:
+                    semaphore.release()
+            await asyncio.sleep(2**attempt)  # Same backoff as the sync adapter
+        return ""
+
+    async def _scrape_job_async(
+        self,
+        client: aiohttp.ClientSession,
+        throttle: DomainThrottle,
+        country: str,
+        topic: str,
+        urls_per_topic: int,
+    ) -> Tuple[str, str, List[Dict[str, str]]]:
+        try:
+            urls = await self.search_news_async(country, topic, urls_per_topic, client)
+            contents = await asyncio.gather(
+                *(self.scrape_content_async(client, throttle, url) for url in urls)
+            )
+        except Exception as e:
+            print(f"Error scraping {country} | {topic}: {str(e)}")
+            return country, topic, []
+
+        articles = [
+            {"url": url, "content": content}
+            for url, content in zip(urls, contents)
+            if content
+        ]
+        return country, topic, articles
+
+    async def scrape_jobs(
+        self, jobs: Iterable[Tuple[str, str]], urls_per_topic: int = 5
+    ) -> AsyncIterator[Tuple[str, str, List[Dict[str, str]]]]:
+        """Scrape every (country, topic) job on one event loop.
+
+        Yields ``(country, topic, articles)`` as each job finishes. All jobs
+        share one pooled HTTP client, and politeness is enforced per domain
+        rather than with a global sleep after every URL.
+        """
+        throttle = DomainThrottle(self.per_domain_concurrency, *self.per_domain_delay)
+        connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=10)
+
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as client:
+            tasks = [
+                asyncio.create_task(
+                    self._scrape_job_async(
+                        client, throttle, country, topic, urls_per_topic
+                    )
+                )
+                for country, topic in jobs
+            ]
+            for task in asyncio.as_completed(tasks):
+                yield await task
+
 
 if __name__ == "__main__":
     # Test the scraper
@@ -0,0 +1,149 @@
+# telemetry.py
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Union
+
+from opentelemetry import metrics, trace
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import (
+    ConsoleMetricExporter,
+    PeriodicExportingMetricReader,
+)
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+logger = logging.getLogger(__name__)
+
+# Instruments are created against the global API providers, which forward to
+# the SDK providers once ``setup_telemetry`` installs them. Until then (or
+# when telemetry is off) every span and measurement is a no-op.
+tracer = trace.get_tracer("newsllm")
+meter = metrics.get_meter("newsllm")
+
+DISCOVERY_DURATION = meter.create_histogram(
+    "newsllm.discovery.duration", unit="s", description="Article URL discovery latency"
+)
+FETCH_DURATION = meter.create_histogram(
+    "http.client.request.duration", unit="s", description="Article page fetches"
+)
+FETCH_BYTES = meter.create_histogram(
+    "http.client.response.body.size", unit="By", description="Article page sizes"
+)
+EXTRACT_DURATION = meter.create_histogram(
+    "newsllm.extract.duration", unit="s", description="Main-text extraction time"
+)
+EMBEDDING_DURATION = meter.create_histogram(
+    "newsllm.embedding.duration", unit="s", description="Embedding model calls"
+)
+EMBEDDING_BATCH_SIZE = meter.create_histogram(
+    "newsllm.embedding.batch_size", unit="{text}", description="Texts per model call"
+)
+VECTOR_STORE_DURATION = meter.create_histogram(
+    "newsllm.vector_store.duration",
+    unit="s",
+    description="Vector store inserts and queries",
+)
+LLM_DURATION = meter.create_histogram(
+    "gen_ai.client.operation.duration", unit="s", description="LLM chain calls"
+)
+LLM_TOKENS = meter.create_histogram(
+    "gen_ai.client.token.usage", unit="{token}", description="LLM tokens per call"
+)
+ADMISSION_WAIT = meter.create_histogram(
+    "newsllm.admission.wait",
+    unit="s",
+    description="Time LLM requests spend queued for admission",
+)
+
+AttributeValue = Union[str, int, float, bool]
+
+_setup_lock = threading.Lock()
+_configured = False
+
+
+def setup_telemetry(exporter: Optional[str] = None) -> bool:
+    """Install the SDK tracer and meter providers once per process.
+
+    ``exporter`` defaults to the ``NEWSLLM_TELEMETRY`` environment variable:
+    ``"otlp"`` sends to a collector over gRPC (``OTEL_EXPORTER_OTLP_ENDPOINT``,
+    by default localhost:4317), ``"console"`` prints to stdout, and anything
+    else leaves telemetry off. The service name comes from
+    ``OTEL_SERVICE_NAME`` and defaults to ``newsllm``. Returns whether
+    telemetry is on.
+    """
+    global _configured
+    exporter = (exporter or os.getenv("NEWSLLM_TELEMETRY", "")).lower()
+    with _setup_lock:
+        if _configured:
+            return True
+        if exporter == "otlp":
+            from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import (
+                OTLPMetricExporter,
+            )
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+                OTLPSpanExporter,
+            )
+
+            span_exporter, metric_exporter = OTLPSpanExporter(), OTLPMetricExporter()
+        elif exporter == "console":
+            span_exporter, metric_exporter = (
+                ConsoleSpanExporter(),
+                ConsoleMetricExporter(),
+            )
+        else:
+            return False
+
+        resource = Resource.create(
+            {"service.name": os.getenv("OTEL_SERVICE_NAME", "newsllm")}
+        )
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        trace.set_tracer_provider(tracer_provider)
+        metrics.set_meter_provider(
+            MeterProvider(
+                resource=resource,
+                metric_readers=[PeriodicExportingMetricReader(metric_exporter)],
+            )
+        )
+        _configured = True
+    logger.info(f"Telemetry enabled ({exporter} exporter)")
+    return True
+
+
+@contextmanager
+def timed_span(
+    name: str, histogram, **attributes: AttributeValue
+) -> Iterator[Dict[str, AttributeValue]]:
+    """Trace a block as a span and record its duration on ``histogram``.
+
+    Yields the attribute dict; entries added inside the block (a status code,
+    an error type) land on both the span and the measurement, so keep them
+    low-cardinality. Per-call detail such as a URL belongs on the span alone,
+    via ``trace.get_current_span().set_attribute``.
+    """
+    start = time.perf_counter()
+    with tracer.start_as_current_span(name) as span:
+        try:
+            yield attributes
+        finally:
+            span.set_attributes(attributes)
+            histogram.record(time.perf_counter() - start, attributes)
+
+
+def record_llm_usage(chain: str, message) -> None:
+    """Record the token counts a chat model reported for one call."""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    span = trace.get_current_span()
+    for token_type in ("input", "output"):
+        count = usage.get(f"{token_type}_tokens", 0)
+        span.set_attribute(f"gen_ai.usage.{token_type}_tokens", count)
+        LLM_TOKENS.record(
+            count, {"newsllm.chain": chain, "gen_ai.token.type": token_type}
+        )
@@ -0,0 +1,149 @@
+# test_admission.py
+
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    now = bucket._updated
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.25) == pytest.approx(0.25)
+    assert bucket.delay(now + 0.5) == 0
+    # Idle time never banks more than the capacity.
+    bucket.take(now + 10)
+    bucket.take(now + 10)
+    assert bucket.delay(now + 10) == pytest.approx(0.5)
+
+
+def _hold(controller, admitted, release):
+    with controller.admit():
+        admitted.set()
+        release.wait(5)
+
+
+def test_full_queue_sheds_new_requests():
+    controller = AdmissionController(
+        rate_per_minute=6000, burst=10, max_concurrency=1, max_queue=1
+    )
+    admitted, release, queued = threading.Event(), threading.Event(), threading.Event()
+    holder = threading.Thread(target=_hold, args=(controller, admitted, release))
+    holder.start()
+    assert admitted.wait(5)
+
+    def wait_in_queue():
+        with controller.admit(on_wait=lambda position: queued.set()):
+            pass
+
+    waiter = threading.Thread(target=wait_in_queue)
+    waiter.start()
+    assert queued.wait(5)
+    try:
+        with pytest.raises(AdmissionRejected):
+            with controller.admit():
+                pass
+    finally:
+        release.set()
+        holder.join()
+        waiter.join()
+    # The queue drained, so the next request is admitted again.
+    with controller.admit():
+        pass
+
+
+def test_requests_waiting_past_max_wait_are_shed():
+    controller = AdmissionController(
+        rate_per_minute=6000, burst=10, max_concurrency=1, max_wait=0.2
+    )
+    admitted, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=_hold, args=(controller, admitted, release))
+    holder.start()
+    assert admitted.wait(5)
+    start = time.monotonic()
+    try:
+        with pytest.raises(AdmissionRejected):
+            with controller.admit():
+                pass
+    finally:
+        release.set()
+        holder.join()
+    assert time.monotonic() - start < 2
+    assert not controller._queue
+
+
+def test_identical_calls_share_one_result():
+    controller = AdmissionController(rate_per_minute=6000, burst=10)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def answer(question):
+        calls.append(question)
+        started.set()
+        release.wait(5)
+        return question.upper()
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(controller.call("key", answer, "why"))
+    )
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(
+        target=lambda: results.append(controller.call("key", answer, "why"))
+    )
+    follower.start()
+    # Give the follower time to join the call in flight.
+    time.sleep(0.2)
+    release.set()
+    leader.join()
+    follower.join()
+    assert calls == ["why"]
+    assert results == ["WHY", "WHY"]
+
+
+def test_calls_without_a_key_never_coalesce():
+    controller = AdmissionController(rate_per_minute=6000, burst=10)
+    calls = []
+    for _ in range(2):
+        controller.call(None, calls.append, "why")
+    assert calls == ["why", "why"]
+
+
+def test_coalesced_stream_replays_from_the_start():
+    controller = AdmissionController(rate_per_minute=6000, burst=10)
+    factories = []
+
+    def factory():
+        factories.append(1)
+        yield from ["a", "b", "c"]
+
+    leader = controller.stream("key", factory)
+    assert next(leader) == "a"
+    follower = controller.stream("key", factory)
+    assert next(follower) == "a"
+    assert list(leader) == ["b", "c"]
+    assert list(follower) == ["b", "c"]
+    assert len(factories) == 1
+
+
+def test_coalesced_stream_fails_with_its_leader():
+    controller = AdmissionController(rate_per_minute=6000, burst=10)
+
+    def factory():
+        yield "a"
+        raise ValueError("model error")
+
+    leader = controller.stream("key", factory)
+    assert next(leader) == "a"
+    follower = controller.stream("key", factory)
+    assert next(follower) == "a"
+    with pytest.raises(ValueError):
+        next(leader)
+    with pytest.raises(AdmissionRejected):
+        next(follower)
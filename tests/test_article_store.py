@@ -0,0 +1,59 @@
+# test_article_store.py
+
+import pytest
+
+from article_store import ArticleStore, text_ref
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ArticleStore(str(tmp_path / "articles.db"))
+    yield store
+    store.close()
+
+
+def _block_count(store):
+    return store._conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+
+def test_texts_round_trip_and_are_stored_once(store):
+    first = ["Council passes budget.", "Vote was close."]
+    second = ["Vote was close.", "Mayor reacts."]
+    refs = store.put_many([first, second])
+    assert refs == [[text_ref(t) for t in first], [text_ref(t) for t in second]]
+
+    texts = store.get_many(refs[0] + refs[1] + ["unknown"])
+    assert texts == {text_ref(t): t for t in first + second}
+    assert store._conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0] == 3
+    # Already stored text does not make a new block.
+    store.put_many([first])
+    assert _block_count(store) == 2
+
+
+def test_retain_drops_unreferenced_texts_and_keeps_the_rest(store):
+    refs = store.put_many(
+        [["Council passes budget.", "Vote was close."], ["Mayor reacts."]]
+    )
+    kept = {refs[0][1], refs[1][0]}
+    assert store.retain(kept) == 1
+    assert store.get_many(refs[0] + refs[1]) == {
+        refs[0][1]: "Vote was close.",
+        refs[1][0]: "Mayor reacts.",
+    }
+    assert store.retain(kept) == 0
+
+    assert store.retain(set()) == 2
+    assert _block_count(store) == 0
+
+
+def test_texts_survive_reopening(tmp_path):
+    path = str(tmp_path / "articles.db")
+    store = ArticleStore(path)
+    refs = store.put_many([["Café opens downtown."]])
+    store.close()
+
+    reopened = ArticleStore(path)
+    try:
+        assert reopened.get_many(refs[0]) == {refs[0][0]: "Café opens downtown."}
+    finally:
+        reopened.close()
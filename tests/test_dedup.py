@@ -0,0 +1,115 @@
+# test_dedup.py
+
+import random
+import sqlite3
+
+import pytest
+
+from dedup import (
+    NEAR_DUPLICATE_THRESHOLD,
+    DedupIndex,
+    article_id,
+    minhash,
+    normalize_url,
+    similarity,
+)
+
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def _story(seed: int, length: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def _edit(text: str, every: int) -> str:
+    words = text.split()
+    return " ".join(
+        f"edited{i}" if i % every == 0 else word for i, word in enumerate(words)
+    )
+
+
+def _article(url, content, country="us", topic="world"):
+    return {"url": url, "content": content, "country": country, "topic": topic}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.db"))
+    yield index
+    index.close()
+
+
+def test_tracking_parameters_do_not_change_the_id():
+    assert normalize_url(
+        "https://www.example.com/story/?utm_source=x&b=2&a=1&fbclid=y#top"
+    ) == normalize_url("http://example.com/story?a=1&b=2")
+    assert article_id("https://example.com/a", "us", "world") != article_id(
+        "https://example.com/a", "us", "business"
+    )
+
+
+def test_large_refreshes_stay_under_the_sqlite_variable_limit(index):
+    # Older SQLite builds allow at most 999 parameters per statement.
+    index._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    articles = [_article(f"https://example.com/{i}", f"Story {i}") for i in range(1500)]
+    entries = index.filter_changed(articles)
+    assert len(entries) == 1500
+    index.record(entries)
+    assert index.filter_changed(articles) == []
+
+
+def test_similarity_threshold():
+    story = _story(1)
+    # One changed word in a hundred stays well above the threshold; one in
+    # three breaks nearly every shingle.
+    assert similarity(minhash(story), minhash(_edit(story, 100))) >= (
+        NEAR_DUPLICATE_THRESHOLD
+    )
+    assert similarity(minhash(story), minhash(_edit(story, 3))) < (
+        NEAR_DUPLICATE_THRESHOLD
+    )
+    assert similarity(minhash(story), minhash(_story(2))) < NEAR_DUPLICATE_THRESHOLD
+
+
+def test_unchanged_articles_are_skipped(index):
+    article = _article("https://example.com/a", _story(1))
+    entries = index.filter_changed([article])
+    assert len(entries) == 1
+    index.record(entries)
+
+    assert index.filter_changed([article]) == []
+    changed = dict(article, content=_story(2))
+    assert [entry[2] for entry in index.filter_changed([changed])] == [changed]
+
+
+def test_syndicated_copies_map_to_the_indexed_article(index):
+    story = _story(1)
+    original = index.filter_changed([_article("https://a.example/s", story)])
+    index.record(original)
+
+    entries = index.filter_changed(
+        [
+            _article("https://b.example/s", _edit(story, 100)),
+            _article("https://c.example/s", _edit(story, 3)),
+            _article("https://d.example/s", story, topic="business"),
+        ]
+    )
+    duplicates = index.find_near_duplicates(entries)
+    assert duplicates == {entries[0][0]: original[0][0]}
+
+    index.record(entries, duplicates)
+    assert index.alternates([original[0][0]]) == {
+        original[0][0]: ["https://b.example/s"]
+    }
+
+
+def test_copies_within_one_batch_are_embedded_once(index):
+    story = _story(1)
+    entries = index.filter_changed(
+        [
+            _article("https://a.example/s", story),
+            _article("https://b.example/s", _edit(story, 100)),
+        ]
+    )
+    assert index.find_near_duplicates(entries) == {entries[1][0]: entries[0][0]}
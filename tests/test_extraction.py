@@ -0,0 +1,54 @@
+# test_extraction.py
+
+import pytest
+
+from extraction import extract_main_text, resolve_parser
+
+BODY = " ".join(
+    f"Paragraph {i} of the report on the council budget vote and its effects."
+    for i in range(12)
+)
+
+PAGE = """
+<html><body>
+  <div class="site-header"><ul class="nav-menu"><li>Home</li><li>World</li></ul></div>
+  <div class="{wrapper}">
+    <div class="entry-content">
+      <h1>Council passes budget</h1>
+      <p>{body}</p>
+      <div class="share-bar">Share on Facebook Share on X</div>
+    </div>
+    <div class="sidebar">Most read: Unrelated story</div>
+  </div>
+  <div id="site-footer">Copyright Example News</div>
+</body></html>
+"""
+
+
+@pytest.fixture(params=["html.parser", "lxml"])
+def parser(request):
+    if resolve_parser(request.param) != request.param:
+        pytest.skip(f"{request.param} is not installed")
+    return request.param
+
+
+@pytest.mark.parametrize(
+    "wrapper",
+    ["site-content", "site-content has-sidebar", "main-wrapper ad-free"],
+)
+def test_modifier_classes_keep_the_content_wrapper(parser, wrapper):
+    text = extract_main_text(PAGE.format(wrapper=wrapper, body=BODY), parser)
+
+    assert "Council passes budget" in text
+    assert BODY in text
+    for chrome in ("Share on Facebook", "Most read", "Copyright", "World"):
+        assert chrome not in text
+
+
+def test_chrome_wrapping_the_main_block_is_kept(parser):
+    html = (
+        f'<html><body><div class="sidebar-layout"><div class="comments">'
+        f"<p>{BODY}</p></div></div></body></html>"
+    )
+
+    assert BODY in extract_main_text(html, parser)
@@ -0,0 +1,51 @@
+# test_http_cache.py
+
+import sqlite3
+
+from http_cache import HttpCache
+
+HEADERS = {"ETag": '"v1"', "Last-Modified": "Tue, 01 Oct 2024 10:00:00 GMT"}
+
+
+def test_pages_from_another_extractor_miss(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite3"))
+    cache.put("https://example.com/a", HEADERS, "Old text", "lxml-1")
+    assert cache.get("https://example.com/a", "lxml-2") is None
+
+    cache.put("https://example.com/a", HEADERS, "New text", "lxml-2")
+    page = cache.get("https://example.com/a", "lxml-2")
+    assert page.text == "New text"
+    assert HttpCache.conditional_headers(page) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": HEADERS["Last-Modified"],
+    }
+    cache.close()
+
+
+def test_pages_cached_before_extractors_were_recorded_miss(tmp_path):
+    path = str(tmp_path / "http_cache.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE pages (url TEXT PRIMARY KEY, etag TEXT, "
+            "last_modified TEXT, text TEXT NOT NULL, size INTEGER NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO pages VALUES ('https://example.com/a', '\"v1\"', NULL, "
+            "'Old text', 8, 0)"
+        )
+    conn.close()
+
+    cache = HttpCache(path)
+    assert cache.get("https://example.com/a", "lxml-2") is None
+    cache.put("https://example.com/a", HEADERS, "New text", "lxml-2")
+    assert cache.get("https://example.com/a", "lxml-2").text == "New text"
+    cache.close()
+
+
+def test_unvalidated_responses_are_not_kept(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite3"))
+    cache.put("https://example.com/a", HEADERS, "Text", "lxml-2")
+    cache.put("https://example.com/a", {}, "Text", "lxml-2")
+    assert cache.get("https://example.com/a", "lxml-2") is None
+    cache.close()
@@ -0,0 +1,57 @@
+# test_journal.py
+
+from journal import RefreshJournal
+
+ARTICLES = [{"url": "https://example.com/a", "title": "A", "content": "Text"}]
+
+
+def test_resume_keeps_finished_jobs_and_ingested_ids(tmp_path):
+    directory = str(tmp_path / "journal")
+    journal = RefreshJournal(directory, max_age_seconds=3600)
+    journal.bind("db", "build-1")
+    journal.save_job("us", "world", ARTICLES)
+    journal.mark_ingested(["a", "b"])
+
+    resumed = RefreshJournal(directory, max_age_seconds=3600)
+    assert resumed.state["started"] == journal.state["started"]
+    assert resumed.has_job("us", "world")
+    assert not resumed.has_job("us", "business")
+    assert resumed.load_job("us", "world") == ARTICLES
+
+    resumed.bind("db", "build-1")
+    resumed.mark_ingested(["c"])
+    assert resumed.ingested() == {"a", "b", "c"}
+
+
+def test_new_store_drops_the_ingest_log(tmp_path):
+    journal = RefreshJournal(str(tmp_path / "journal"), max_age_seconds=3600)
+    journal.bind("db", "build-1")
+    journal.save_job("us", "world", ARTICLES)
+    journal.mark_ingested(["a"])
+
+    journal.bind("db", "build-2")
+    assert journal.ingested() == set()
+    # Scraped jobs do not depend on the store.
+    assert journal.has_job("us", "world")
+
+
+def test_stale_journal_starts_over(tmp_path):
+    directory = str(tmp_path / "journal")
+    journal = RefreshJournal(directory, max_age_seconds=3600)
+    journal.save_job("us", "world", ARTICLES)
+    journal.mark_ingested(["a"])
+
+    fresh = RefreshJournal(directory, max_age_seconds=-1)
+    assert not fresh.has_job("us", "world")
+    assert fresh.ingested() == set()
+    assert fresh.base is None
+
+
+def test_corrupt_state_starts_over(tmp_path):
+    directory = tmp_path / "journal"
+    RefreshJournal(str(directory), max_age_seconds=3600)
+    (directory / "state.json").write_text("{")
+
+    journal = RefreshJournal(str(directory), max_age_seconds=3600)
+    assert journal.state["base"] is None
+    assert journal.ingested() == set()
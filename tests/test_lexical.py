@@ -0,0 +1,59 @@
+# test_lexical.py
+
+import pytest
+
+from lexical import LexicalIndex, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.db"))
+    yield index
+    index.close()
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("The Senate passed a budget, and X voted") == [
+        "senate",
+        "passed",
+        "budget",
+        "voted",
+    ]
+
+
+def test_bm25_ranks_rarer_and_denser_matches_first(index):
+    index.add(
+        [
+            ("c1", "a1", "us|world", "senate budget vote budget"),
+            ("c2", "a2", "us|world", "senate hearing on trade"),
+            ("c3", "a3", "us|world", "senate recess begins"),
+            ("c4", "a4", "uk|world", "budget budget budget"),
+        ]
+    )
+    results = index.search("senate budget", "us|world")
+    assert [chunk_id for chunk_id, _ in results][0] == "c1"
+    assert {chunk_id for chunk_id, _ in results} == {"c1", "c2", "c3"}
+    # The other partition's chunks do not match.
+    assert [chunk_id for chunk_id, _ in index.search("budget", "us|world")] == ["c1"]
+    assert index.search("the and", "us|world") == []
+
+
+def test_removed_chunks_leave_the_index(index):
+    index.add(
+        [
+            ("c1", "a1", "us|world", "senate budget"),
+            ("c2", "a1", "us|world", "budget vote"),
+            ("c3", "a2", "us|world", "budget hearing"),
+        ]
+    )
+    index.remove_parents(["a1"])
+    assert [chunk_id for chunk_id, _ in index.search("budget", "us|world")] == ["c3"]
+    index.remove(["c3"])
+    assert index.is_empty()
+
+
+def test_readding_a_chunk_replaces_its_postings(index):
+    index.add([("c1", "a1", "us|world", "senate budget")])
+    index.add([("c1", "a1", "us|world", "trade talks")])
+    assert index.search("budget", "us|world") == []
+    assert [chunk_id for chunk_id, _ in index.search("trade", "us|world")] == ["c1"]